@@ -0,0 +1,491 @@
+"""
+Replays feed entries through parse.parse_entry, the stage that turns an Atom
+entry into an alert, and reports entries per second and how much memory each
+entry costs. The entries are generated at random or loaded from a recorded
+feed (like one saved with curl, or by save_bad_xml).
+
+Python 2 can't count allocations: there is no tracemalloc, and the garbage
+collector only sees containers. So the memory figure is the number of
+containers (lists, dicts, alerts) each entry leaves behind, which misses the
+strings, floats and datetimes the stage allocates along the way. Where
+tracemalloc is available (Python 3, or Python 2 patched with pytracemalloc)
+the peak traced bytes per entry are reported as well.
+
+    $ python benchmarks/entries.py [--count N] [--seed S] [--recorded FEED] [--profile]
+
+With --fuzz, each entry is mutated in a way the feed could plausibly get
+wrong, and the report shows which mutations make the stage raise and what
+every mutation costs. The entries that raised can be saved for replaying:
+
+    $ python benchmarks/entries.py --fuzz [--count N] [--seed S] [--save-crashes DIR]
+
+CAP documents aren't requested. Generated entries get a synthetic one, and
+recorded entries are parsed as if their CAP request had failed.
+"""
+
+import argparse
+import copy
+import cProfile
+import gc
+import math
+import os
+import pstats
+import random
+import sys
+import time
+
+from xml.sax.saxutils import escape
+
+CUR_DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT_DIR = os.path.dirname(CUR_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from lxml import etree as ET
+
+import parse
+
+from lib.parser import Parser
+
+try:
+    # Only in Python 3, or a Python 2 patched with pytracemalloc
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+EVENTS = ["Tornado Warning", "Flood Watch", "Winter Storm Warning", "Special Weather Statement",
+    "Severe Thunderstorm Warning", "Heat Advisory", "Wind Advisory", "Red Flag Warning"]
+SEVERITIES = ["Extreme", "Severe", "Moderate", "Minor", "Unknown", ""]
+SENDERS = ["NWS Wichita (Central Kansas)", "NWS Reno (western Nevada)", "NWS Norman (Norman, Oklahoma)",
+    "NWS Boise", ""]
+TIMEZONES = ["CDT", "EDT", "MDT", "PDT", "AKDT", "HST"]
+
+FEED_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:cap="urn:oasis:names:tc:emergency:cap:1.1">%s</feed>"""
+
+ENTRY_TEMPLATE = """
+<entry>
+<id>http://alerts.weather.gov/cap/wwacapget.php?x=%(id)s</id>
+<updated>2013-10-10T%(hour)02d:%(minute)02d:00-05:00</updated>
+<published>2013-10-10T%(hour)02d:00:00-05:00</published>
+<author><name>w-nws.webmaster@noaa.gov</name></author>
+<title>%(event)s issued October 10 at 9:00AM %(tz)s until October 10 at 11:00PM %(tz)s by NWS</title>
+<link href="http://alerts.weather.gov/cap/wwacapget.php?x=%(id)s"/>
+<summary>...THE NATIONAL WEATHER SERVICE HAS ISSUED A %(event_upper)s...</summary>
+<cap:event>%(event)s</cap:event>
+<cap:effective>2013-10-10T%(hour)02d:00:00-05:00</cap:effective>
+<cap:expires>2013-10-10T23:00:00-05:00</cap:expires>
+<cap:status>Actual</cap:status>
+<cap:msgType>Alert</cap:msgType>
+<cap:category>Met</cap:category>
+<cap:urgency>Expected</cap:urgency>
+<cap:severity>%(severity)s</cap:severity>
+<cap:certainty>Likely</cap:certainty>
+<cap:areaDesc>%(area_description)s</cap:areaDesc>
+<cap:polygon>%(polygon)s</cap:polygon>
+<cap:geocode>
+<valueName>FIPS6</valueName>
+<value>%(fips)s</value>
+<valueName>UGC</valueName>
+<value>%(ugc)s</value>
+</cap:geocode>
+<cap:parameter>
+<valueName>VTEC</valueName>
+<value></value>
+</cap:parameter>
+</entry>"""
+
+CAP_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<alert xmlns="urn:oasis:names:tc:emergency:cap:1.1">
+<note>%(note)s</note>
+<info>
+<senderName>%(sender)s</senderName>
+<description>%(description)s</description>
+<instruction>Move to an interior room on the lowest floor of a sturdy building.</instruction>
+</info>
+</alert>"""
+
+class QuietParser(Parser):
+    """
+    Counts log messages instead of printing and writing them, so the numbers
+    are for parsing rather than for the terminal and the disk.
+    """
+
+    def __init__(self, root_dir):
+        Parser.__init__(self, root_dir)
+        self.log_count = 0
+
+    def log(self, message):
+        self.log_count += 1
+
+    def log_error(self, message):
+        self.log_count += 1
+
+    def log_missing_fips(self, fips_code):
+        self.log_count += 1
+
+    def log_missing_ugc(self, ugc_code):
+        self.log_count += 1
+
+    def log_special_statement(self, message):
+        self.log_count += 1
+
+### Entries ###
+
+def create_polygon_string(lng, lat, vertices_count):
+    # The feed has "lat,lng" pairs separated by spaces, with the first repeated at the end
+    points = []
+    for i in range(vertices_count):
+        angle = 2 * math.pi * i / vertices_count
+        radius = 0.3 + random.uniform(-0.01, 0.01)
+        points.append("%.2f,%.2f" % (lat + radius * math.sin(angle), lng + radius * math.cos(angle)))
+    points.append(points[0])
+    return " ".join(points)
+
+def create_entries(parser, count, seed=1):
+    """
+    Returns a list of random entry elements that look like the ones in the
+    real feed, using the county and zone data so the lookups mostly succeed.
+    """
+
+    random.seed(seed)
+    entries_xml = []
+
+    for i in range(count):
+        counties = random.sample(parser.counties_list, random.randint(1, 8))
+        zones = random.sample(parser.ugc_zones_list, random.randint(0, 6))
+        ugc_codes = [z['state'] + 'Z' + z['zone'] for z in zones] + [c['ugc'][0:2] + 'C' + c['ugc'][2:] for c in counties[:2]]
+        event = random.choice(EVENTS)
+
+        polygon = ""
+        if random.random() < 0.5:
+            polygon = create_polygon_string(counties[0]['lng'], counties[0]['lat'], random.randint(4, 20))
+
+        entries_xml.append(ENTRY_TEMPLATE % {
+            'id': "%s.%d" % (seed, i),
+            'hour': random.randint(0, 22),
+            'minute': random.randint(0, 59),
+            'event': event,
+            'event_upper': event.upper(),
+            'tz': random.choice(TIMEZONES),
+            'severity': random.choice(SEVERITIES),
+            'area_description': escape("; ".join(c['name'] for c in counties)),
+            'polygon': polygon,
+            'fips': " ".join(c['fips'] for c in counties),
+            'ugc': " ".join(ugc_codes),
+        })
+
+    tree = ET.fromstring((FEED_TEMPLATE % "".join(entries_xml)).encode('UTF-8'))
+    return tree.findall(parse.ATOM_NS + 'entry')
+
+def load_recorded_entries(filepath, count):
+    """
+    Returns count entries from a recorded feed, repeating them if the feed
+    has fewer.
+    """
+
+    with open(filepath, 'rb') as f:
+        entries_list = ET.fromstring(f.read()).findall(parse.ATOM_NS + 'entry')
+    if not entries_list:
+        sys.exit("No entries found in %s" % filepath)
+    return [entries_list[i % len(entries_list)] for i in range(count)]
+
+def create_cap_trees(parser, count=50):
+    """
+    Returns a few parsed CAP documents to hand out to the entries. They are
+    parsed up front because requesting them isn't part of the stage.
+    """
+
+    keywords = [key for key, value in parser.special_replacements_list if not isinstance(key, list)]
+    cap_trees = []
+    for i in range(count):
+        cap_trees.append(ET.fromstring((CAP_TEMPLATE % {
+            'note': random.choice(["", "Test note"]),
+            'sender': random.choice(SENDERS),
+            'description': "THE NATIONAL WEATHER SERVICE REPORTS %s. " % " AND ".join(
+                random.sample(keywords, random.randint(0, 3))).upper() * 5,
+        }).encode('UTF-8')))
+    return cap_trees
+
+### Measuring ###
+
+def run_stage(parser, entries_list, get_cap_tree):
+    return [parse.parse_entry(parser, entry_el, get_cap_tree) for entry_el in entries_list]
+
+def measure_throughput(parser, entries_list, get_cap_tree, runs=3):
+    # Best of a few runs, so a busy machine doesn't count against the stage
+    best_time = None
+    for run in range(runs):
+        start = time.time()
+        run_stage(parser, entries_list, get_cap_tree)
+        elapsed = time.time() - start
+        if best_time is None or elapsed < best_time:
+            best_time = elapsed
+    return len(entries_list) / best_time
+
+def measure_allocations(parser, entries_list, get_cap_tree):
+    """
+    Returns the number of gc-tracked containers each entry leaves behind (its
+    alert and the lists and dicts in it) and, when tracemalloc is available,
+    the peak traced bytes per entry. The container count is not an allocation
+    count: it misses strings, floats, datetimes and anything freed before
+    the stage returns. Memory allocated inside lxml is not counted by either.
+    """
+
+    gc.collect()
+    gc.disable()
+    try:
+        objects_before = len(gc.get_objects())
+        if tracemalloc is not None:
+            tracemalloc.start()
+        alerts_list = run_stage(parser, entries_list, get_cap_tree)
+        if tracemalloc is not None:
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            peak_bytes = None
+        objects_after = len(gc.get_objects())
+    finally:
+        gc.enable()
+
+    # The list holding the alerts doesn't count
+    objects_per_entry = (objects_after - objects_before - 1) / float(len(alerts_list))
+    bytes_per_entry = peak_bytes / float(len(alerts_list)) if peak_bytes is not None else None
+    return objects_per_entry, bytes_per_entry
+
+def print_benchmark(parser, entries_list, get_cap_tree, profile=False):
+
+    log_count_before = parser.log_count
+    alerts_list = run_stage(parser, entries_list, get_cap_tree)
+    skipped_count = len([a for a in alerts_list if a is None])
+    log_count = parser.log_count - log_count_before
+
+    entries_per_second = measure_throughput(parser, entries_list, get_cap_tree)
+    objects_per_entry, bytes_per_entry = measure_allocations(parser, entries_list, get_cap_tree)
+
+    print "%d entries (%d skipped events, %.1f log messages per entry)" % (len(entries_list), skipped_count,
+        log_count / float(len(entries_list)))
+    print "%-30s %12.0f" % ("entries/sec", entries_per_second)
+    print "%-30s %12.1f" % ("us/entry", 1000000.0 / entries_per_second)
+    print "%-30s %12.1f" % ("containers retained/entry", objects_per_entry)
+    if bytes_per_entry is not None:
+        print "%-30s %12.0f" % ("peak traced bytes/entry", bytes_per_entry)
+    else:
+        print "%-30s %12s" % ("peak traced bytes/entry", "n/a (no tracemalloc)")
+
+    if profile:
+        profiler = cProfile.Profile()
+        profiler.runcall(run_stage, parser, entries_list, get_cap_tree)
+        print
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+### Fuzzing ###
+
+DATE_TAGS = [parse.ATOM_NS + 'updated', parse.ATOM_NS + 'published', parse.CAP_NS + 'effective',
+    parse.CAP_NS + 'expires']
+TEXT_TAGS = DATE_TAGS + [parse.ATOM_NS + 'id', parse.ATOM_NS + 'title', parse.ATOM_NS + 'summary',
+    parse.CAP_NS + 'event', parse.CAP_NS + 'severity', parse.CAP_NS + 'areaDesc']
+
+def set_text(entry_el, tag, text):
+    el = entry_el.find(tag)
+    if el is not None:
+        el.text = text
+    return text
+
+def mutate_drop_element(entry_el, rng):
+    tag = rng.choice(TEXT_TAGS + [parse.ATOM_NS + 'link', parse.CAP_NS + 'geocode', parse.CAP_NS + 'polygon'])
+    el = entry_el.find(tag)
+    if el is not None:
+        entry_el.remove(el)
+    return tag.split('}')[1]
+
+def mutate_empty_text(entry_el, rng):
+    tag = rng.choice(TEXT_TAGS)
+    set_text(entry_el, tag, "")
+    return tag.split('}')[1]
+
+def mutate_bad_date(entry_el, rng):
+    tag = rng.choice(DATE_TAGS)
+    return set_text(entry_el, tag, rng.choice(["TBD", "2013-13-45T99:00:00", "2013-10-10T10:00:00",
+        "0000-00-00T00:00:00Z", "10/10/2013 10:00 PM", "2013-10-10T10:00:00-05:00 extra"]))
+
+def mutate_bad_polygon(entry_el, rng):
+    polygon = rng.choice([
+        "38.1,-97.2 38.3",
+        "38.1,-97.2 abc,def 38.0,-96.8 38.1,-97.2",
+        "38.1,-97.2  38.3,-97.0 38.0,-96.8 38.1,-97.2",
+        "38.1;-97.2 38.3;-97.0 38.0;-96.8 38.1;-97.2",
+        "38.1,-97.2 0.0,0.0 38.0,-96.8 38.1,-97.2",
+        "38.1,-97.2,5 38.3,-97.0,5 38.0,-96.8,5 38.1,-97.2,5",
+        "38.1,-97.2",
+        " ".join("%.2f,%.2f" % (38 + rng.random(), -97 + rng.random()) for i in range(2000)),
+    ])
+    el = entry_el.find(parse.CAP_NS + 'polygon')
+    if el is None:
+        el = ET.SubElement(entry_el, parse.CAP_NS + 'polygon')
+    el.text = polygon
+    return polygon[:40]
+
+def mutate_orphan_geocode(entry_el, rng):
+    # A valueName without the value that should follow it
+    geocode_el = entry_el.find(parse.CAP_NS + 'geocode')
+    if geocode_el is None:
+        return "no geocode"
+    value_els = geocode_el.findall(parse.ATOM_NS + 'value')
+    choice = rng.randint(0, 2)
+    if choice == 0:
+        geocode_el.remove(rng.choice(value_els))
+        return "value removed"
+    elif choice == 1:
+        rng.choice(value_els).text = None
+        return "value empty"
+    else:
+        rng.choice(value_els).text = "  "
+        return "value blank"
+
+def mutate_unknown_codes(entry_el, rng):
+    codes = rng.choice(["999999 ant", "ant", "KSZ999 ZZC001", "KS KSZ", "K", "KSZ083  KSC001", "ksz083"])
+    value_els = entry_el.findall(parse.CAP_NS + 'geocode/' + parse.ATOM_NS + 'value')
+    if value_els:
+        rng.choice(value_els).text = codes
+    return codes
+
+def mutate_title(entry_el, rng):
+    title = rng.choice(["until", "Flood Watch until", "Flood Watch by NWS", "", "x" * 10000,
+        u"Avis de temp\u00eate issued until October 10 by NWS"])
+    set_text(entry_el, parse.ATOM_NS + 'title', title)
+    return title[:40]
+
+def mutate_event(entry_el, rng):
+    event = rng.choice(["Special Weather Statement", "Severe Weather Statement", "Test", "TEST", "",
+        u"Temp\u00eate Warning"])
+    set_text(entry_el, parse.CAP_NS + 'event', event)
+    return event
+
+MUTATIONS = [
+    ("drop element", mutate_drop_element),
+    ("empty text", mutate_empty_text),
+    ("bad date", mutate_bad_date),
+    ("bad polygon", mutate_bad_polygon),
+    ("orphan geocode", mutate_orphan_geocode),
+    ("unknown codes", mutate_unknown_codes),
+    ("odd title", mutate_title),
+    ("odd event", mutate_event),
+]
+
+def create_fuzz_cap_tree(rng):
+    # CAP documents can be just as broken, mostly in the sender we take the region from
+    sender = rng.choice(SENDERS + ["NWS ()", "NWS (", ")(", "(Central Kansas)", "NWS (x)", u"NWS (\u00e9t\u00e9)"])
+    description = rng.choice(["", "DENSE FOG AND HEAVY RAIN", u"\u00e9" * 100, "x" * 100000])
+    cap_tree = ET.fromstring(CAP_TEMPLATE % {'note': "", 'sender': "", 'description': ""})
+    info_el = cap_tree.find(parse.CAP_NS + 'info')
+    info_el.find(parse.CAP_NS + 'senderName').text = sender
+    info_el.find(parse.CAP_NS + 'description').text = description
+    return cap_tree, "sender %r" % sender
+
+def get_crash_location(traceback):
+    location = None
+    while traceback is not None:
+        filepath = traceback.tb_frame.f_code.co_filename
+        if os.path.realpath(filepath).startswith(ROOT_DIR + os.sep):
+            location = "%s:%d" % (os.path.relpath(os.path.realpath(filepath), ROOT_DIR), traceback.tb_lineno)
+        traceback = traceback.tb_next
+    return location
+
+def run_fuzz(parser, entries_list, cap_trees, seed=1, save_crashes_dir=None):
+    """
+    Applies every mutation to every entry, times the stage on the result and
+    groups the exceptions it raised. The mutated entries get one of the
+    cap_trees, or none as if the request had failed.
+    """
+
+    rng = random.Random(seed)
+    results = {}
+    crashes = {}
+
+    mutations = MUTATIONS + [("odd CAP document", None)]
+
+    for entry_el in entries_list:
+        for name, mutate in mutations:
+            mutated_el = copy.deepcopy(entry_el)
+            if mutate is None:
+                cap_tree, detail = create_fuzz_cap_tree(rng)
+            else:
+                cap_tree = None if rng.random() < 0.2 else rng.choice(cap_trees)
+                detail = mutate(mutated_el, rng)
+
+            start = time.time()
+            try:
+                parse.parse_entry(parser, mutated_el, lambda alert: cap_tree)
+                error = None
+            except Exception as e:
+                error = e
+            elapsed = time.time() - start
+
+            runs, crash_count, total_time, max_time = results.get(name, (0, 0, 0.0, 0.0))
+            results[name] = (runs + 1, crash_count + (error is not None), total_time + elapsed,
+                max(max_time, elapsed))
+
+            if error is not None:
+                # Group crashes by mutation and the last line of our code they went through
+                location = get_crash_location(sys.exc_info()[2])
+                signature = (name, type(error).__name__, location)
+                if signature not in crashes:
+                    crashes[signature] = [0, detail, str(error)[:80], ET.tostring(mutated_el), cap_tree]
+                crashes[signature][0] += 1
+
+    print "%d entries, %d mutations each" % (len(entries_list), len(mutations))
+    print "%-18s %6s %8s %10s %10s" % ("mutation", "runs", "crashes", "mean us", "max us")
+    for name, mutate in mutations:
+        runs, crash_count, total_time, max_time = results[name]
+        print "%-18s %6d %8d %10.1f %10.1f" % (name, runs, crash_count, total_time / runs * 1000000,
+            max_time * 1000000)
+
+    if not crashes:
+        print "\nNo crashes."
+        return
+
+    print "\nCrashes:"
+    for number, signature in enumerate(sorted(crashes, key=lambda s: -crashes[s][0])):
+        count, detail, message, entry_xml, cap_tree = crashes[signature]
+        print "%4dx %-18s %s at %s: %s" % (count, signature[0], signature[1], signature[2], message)
+        print "      e.g. %r" % detail
+
+        if save_crashes_dir:
+            if not os.path.exists(save_crashes_dir):
+                os.makedirs(save_crashes_dir)
+            # Saved as a feed, so it can be replayed with --recorded
+            filepath = os.path.join(save_crashes_dir, 'crash_%02d.xml' % number)
+            with open(filepath, 'wb') as f:
+                f.write(FEED_TEMPLATE % entry_xml)
+            if cap_tree is not None:
+                with open(os.path.join(save_crashes_dir, 'crash_%02d_cap.xml' % number), 'wb') as f:
+                    f.write(ET.tostring(cap_tree))
+
+if __name__ == "__main__":
+
+    arg_parser = argparse.ArgumentParser(description="Measure or fuzz the per-entry parsing stage.")
+    arg_parser.add_argument('--count', type=int, default=2000, help="number of entries")
+    arg_parser.add_argument('--seed', type=int, default=1, help="seed for the random entries")
+    arg_parser.add_argument('--recorded', metavar='FEED', help="replay the entries in a recorded feed")
+    arg_parser.add_argument('--profile', action='store_true', help="print where the time goes")
+    arg_parser.add_argument('--fuzz', action='store_true', help="mutate the entries and report crashes")
+    arg_parser.add_argument('--save-crashes', metavar='DIR', help="save an entry for each kind of crash")
+    args = arg_parser.parse_args()
+
+    parser = QuietParser(ROOT_DIR)
+
+    if args.recorded:
+        entries_list = load_recorded_entries(args.recorded, args.count)
+    else:
+        entries_list = create_entries(parser, args.count, args.seed)
+    cap_trees = create_cap_trees(parser)
+
+    if args.recorded:
+        get_cap_tree = None
+    else:
+        get_cap_tree = lambda alert: cap_trees[hash(alert.uuid) % len(cap_trees)]
+
+    if args.fuzz:
+        run_fuzz(parser, entries_list, cap_trees, args.seed, args.save_crashes)
+    else:
+        print_benchmark(parser, entries_list, get_cap_tree, args.profile)
@@ -0,0 +1,67 @@
+"""
+Reports the size of the GeoJSON export and how long it takes to build, from
+scratch and incrementally, for synthetic alerts with dense polygons.
+
+    $ python benchmarks/geometry.py [number of alerts] [vertices per polygon]
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+CUR_DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT_DIR = os.path.dirname(CUR_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from lib.geometry import GeometryExporter
+from lib.parser import Parser
+from synthetic import create_alerts
+
+def time_export(parser, cache_filepath, alerts_list, **kwargs):
+    exporter = GeometryExporter(cache_filepath, parser.ugc_zones_dict, **kwargs)
+    start = time.time()
+    output, built_count = exporter.export(alerts_list)
+    return time.time() - start, output, built_count
+
+if __name__ == "__main__":
+
+    alerts_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    vertices_count = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+
+    root_dir = tempfile.mkdtemp()
+    try:
+        parser = Parser(ROOT_DIR)
+        alerts_list = create_alerts(parser, alerts_count, polygon_vertices=vertices_count)
+        cache_filepath = os.path.join(root_dir, 'geometry_cache.json')
+
+        # What the polygons cost at full precision, as embedded in the detail files
+        raw_size = sum([len(json.dumps(a.polygon)) for a in alerts_list])
+
+        print "%d alerts, %d vertices per polygon" % (alerts_count, vertices_count)
+        print "%-36s %10s %10s %10s" % ("", "ms", "bytes", "built")
+        print "%-36s %10s %10d" % ("raw polygons (full precision)", "-", raw_size)
+
+        unsimplified_time, output, built_count = time_export(parser, cache_filepath + '.raw', alerts_list,
+            tolerance=0, precision=15)
+        print "%-36s %10.1f %10d %10d" % ("export, not simplified", unsimplified_time * 1000, len(output),
+            built_count)
+
+        full_time, output, built_count = time_export(parser, cache_filepath, alerts_list)
+        print "%-36s %10.1f %10d %10d" % ("export, simplified (from scratch)", full_time * 1000, len(output),
+            built_count)
+
+        incremental_time, output, built_count = time_export(parser, cache_filepath, alerts_list)
+        print "%-36s %10.1f %10d %10d" % ("export, nothing changed", incremental_time * 1000, len(output),
+            built_count)
+
+        # Update one alert in ten
+        for alert in alerts_list[::10]:
+            alert.updated = "2013-10-10T16:00:00+00:00"
+        incremental_time, output, built_count = time_export(parser, cache_filepath, alerts_list)
+        print "%-36s %10.1f %10d %10d" % ("export, 10% changed", incremental_time * 1000, len(output),
+            built_count)
+    finally:
+        shutil.rmtree(root_dir)
@@ -0,0 +1,81 @@
+"""
+Compares the wall time of writing every output file by running the parse.py
+and create_pages.py stages separately, which round trips the alerts through
+JSON, against handing them over in memory with pipeline.py.
+
+The feed is not requested; the alerts are synthetic.
+
+    $ python benchmarks/handoff.py [number of alerts]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+CUR_DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT_DIR = os.path.dirname(CUR_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import create_pages
+import parse
+import pipeline
+
+from lib.index import AlertIndex
+from lib.parser import Parser
+from lib.writer import OutputWriter
+from synthetic import create_alerts
+
+def run_separately(parser, alerts_list, alert_index):
+
+    # What parse.py does
+    dt_now, now, next_update = parse.schedule_next_update(parser, alerts_list)
+    writer = OutputWriter(parser.output_dir, 'json')
+    writer.begin()
+    output_full = parse.write_alerts(parser, writer, alerts_list, alert_index, now, next_update)
+    writer.publish()
+    parse.write_state(parser, output_full, alerts_list, dt_now)
+
+    # What create_pages.py does
+    created, next_update, alerts, full_alerts = create_pages.load_alerts(parser.output_dir)
+    json_writer = OutputWriter(parser.output_dir, 'json')
+    json_writer.begin()
+    create_pages.write_json_pages(json_writer, created, next_update, alerts, full_alerts)
+    json_writer.publish()
+    html_writer = OutputWriter(parser.output_dir, 'html')
+    html_writer.begin()
+    create_pages.write_html_pages(html_writer, created, full_alerts)
+    html_writer.publish()
+
+def best_time(function, parser, alerts_list, alert_index, runs=5):
+    timings = []
+    for i in range(runs):
+        start = time.time()
+        function(parser, alerts_list, alert_index)
+        timings.append(time.time() - start)
+    return min(timings)
+
+if __name__ == "__main__":
+
+    alerts_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    root_dir = tempfile.mkdtemp()
+    try:
+        os.symlink(os.path.join(ROOT_DIR, 'data'), os.path.join(root_dir, 'data'))
+        parser = Parser(root_dir)
+
+        alerts_list = create_alerts(parser, alerts_count)
+        alert_index = AlertIndex()
+        for alert in alerts_list:
+            alert_index.add(alert)
+
+        separate_time = best_time(run_separately, parser, alerts_list, alert_index)
+        pipeline_time = best_time(pipeline.run_pipeline, parser, alerts_list, alert_index)
+
+        print "%d alerts" % alerts_count
+        print "%-32s %10.1f ms" % ("parse.py then create_pages.py", separate_time * 1000)
+        print "%-32s %10.1f ms" % ("pipeline.py", pipeline_time * 1000)
+        print "%-32s %10.1f ms" % ("saved", (separate_time - pipeline_time) * 1000)
+    finally:
+        shutil.rmtree(root_dir)
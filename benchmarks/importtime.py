@@ -0,0 +1,65 @@
+"""
+Reports the cold-start import cost of the modules used by parse.py and
+create_pages.py, in the spirit of `python -X importtime`.
+
+Every import is timed in a fresh interpreter so nothing is already cached
+in sys.modules. Run it from the project root:
+
+    $ python benchmarks/importtime.py
+"""
+
+import os
+import subprocess
+import sys
+
+CUR_DIR = os.path.dirname(os.path.realpath(__file__))
+ROOT_DIR = os.path.dirname(CUR_DIR)
+
+# The modules we care about, roughly from heaviest to lightest
+MODULES = [
+    'shapely.geometry',
+    'jinja2',
+    'arrow',
+    'lxml.etree',
+    'dateutil.parser',
+    'pytz',
+    'lib.parser',
+    'parse',
+]
+
+# How many fresh interpreters to start for each module
+RUNS = 5
+
+TIMING_SNIPPET = """
+import time
+start = time.time()
+import %s
+print(time.time() - start)
+"""
+
+def time_import(module_name):
+    """
+    Returns the best of RUNS cold import times, in milliseconds. Returns
+    None if the module could not be imported.
+    """
+    timings = []
+    for i in range(RUNS):
+        try:
+            output = subprocess.check_output([sys.executable, '-c', TIMING_SNIPPET % module_name],
+                cwd=ROOT_DIR, stderr=subprocess.STDOUT)
+        except subprocess.CalledProcessError:
+            return None
+        timings.append(float(output.strip().splitlines()[-1]) * 1000.0)
+    return min(timings)
+
+if __name__ == "__main__":
+
+    print "Cold import times (best of %d runs)" % RUNS
+    print "%-20s %10s" % ("module", "ms")
+
+    for module_name in MODULES:
+        elapsed = time_import(module_name)
+        if elapsed is None:
+            print "%-20s %10s" % (module_name, "missing")
+        else:
+            print "%-20s %10.1f" % (module_name, elapsed)
@@ -0,0 +1,72 @@
+"""
+Compares writing a run's worth of small files one at a time with codecs.open
+(the old approach) against staging them with the OutputWriter and publishing
+the whole tree at once.
+
+    $ python benchmarks/output_writer.py [number of files]
+"""
+
+import codecs
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+CUR_DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(CUR_DIR))
+
+from lib.writer import OutputWriter
+
+# Roughly the size of an alert detail file
+FILE_CONTENTS = u'{"description": "%s"}' % (u"x" * 2000)
+
+def write_with_codecs(root_dir, files_count):
+    directory = os.path.join(root_dir, 'json', 'detail')
+    os.makedirs(directory)
+    start = time.time()
+    for i in range(files_count):
+        filepath = os.path.join(directory, '%d.json' % i)
+        with codecs.open(filepath, 'w', 'UTF-8') as f:
+            f.write(FILE_CONTENTS)
+    return time.time() - start, 0.0
+
+def write_with_output_writer(root_dir, files_count):
+    writer = OutputWriter(root_dir, 'json')
+    start = time.time()
+    writer.begin()
+    for i in range(files_count):
+        writer.write('detail/%d.json' % i, FILE_CONTENTS)
+    publish_start = time.time()
+    writer.publish()
+    end = time.time()
+    return end - start, end - publish_start
+
+def run(method, files_count, runs=3):
+    """
+    Returns the best (total, publish) times over a few runs. The second and
+    later runs of the OutputWriter include seeding from the previous generation.
+    """
+    root_dir = tempfile.mkdtemp()
+    try:
+        results = []
+        for i in range(runs):
+            if method is write_with_codecs:
+                shutil.rmtree(os.path.join(root_dir, 'json'), ignore_errors=True)
+            results.append(method(root_dir, files_count))
+        return min(results)
+    finally:
+        shutil.rmtree(root_dir)
+
+if __name__ == "__main__":
+
+    files_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    print "Writing %d files" % files_count
+    print "%-16s %12s %12s" % ("method", "total (ms)", "publish (ms)")
+
+    total, publish = run(write_with_codecs, files_count)
+    print "%-16s %12.1f %12s" % ("codecs.open", total * 1000, "-")
+
+    total, publish = run(write_with_output_writer, files_count)
+    print "%-16s %12.1f %12.1f" % ("OutputWriter", total * 1000, publish * 1000)
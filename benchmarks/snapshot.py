@@ -0,0 +1,95 @@
+"""
+Compares reloading a run from alerts.json against reloading it from the
+columnar snapshot log, and times a history query over a day of runs.
+
+    $ python benchmarks/snapshot.py [number of alerts]
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+CUR_DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(CUR_DIR))
+
+from lib.parser import Parser
+from lib.snapshot import SnapshotLog
+
+EVENTS = ["Tornado Warning", "Flood Watch", "Winter Storm Warning", "Special Weather Statement",
+    "Severe Thunderstorm Warning", "Heat Advisory", "Wind Advisory", "Red Flag Warning"]
+SEVERITIES = ["Extreme", "Severe", "Moderate", "Minor", "Unknown"]
+STATES = ["Kansas", "Missouri", "Texas", "Oklahoma", "Nebraska", "Iowa", "Colorado"]
+
+# Runs in a day at one run every five minutes
+RUNS_PER_DAY = 288
+
+def create_alerts(alerts_count):
+    """
+    Returns synthetic alerts with about as much text as real ones.
+    """
+    alerts_list = []
+    for i in range(alerts_count):
+        alert = Parser.Alert()
+        alert.uuid = hashlib.sha1(str(i)).hexdigest()
+        alert.event = random.choice(EVENTS)
+        alert.severity = random.choice(SEVERITIES)
+        alert.states = random.sample(STATES, random.randint(1, 3))
+        alert.updated = "2013-10-10T15:%02d:00+00:00" % (i % 60)
+        alert.expires = "2013-10-11T03:%02d:00+00:00" % (i % 60)
+        alert.description = "THE NATIONAL WEATHER SERVICE HAS ISSUED A WARNING. " * 30
+        alert.counties = [{"name": "County", "state": "KS", "fips": "020001", "lat": 38.0,
+            "lng": -97.0, "bbox": [-97.1, 37.9, -96.9, 38.1]}] * 5
+        alerts_list.append(alert)
+    return alerts_list
+
+def best_time(function, runs=5):
+    timings = []
+    for i in range(runs):
+        start = time.time()
+        function()
+        timings.append(time.time() - start)
+    return min(timings)
+
+if __name__ == "__main__":
+
+    alerts_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    alerts_list = create_alerts(alerts_count)
+
+    root_dir = tempfile.mkdtemp()
+    try:
+        # The JSON file the next run and create_pages.py read today
+        json_filepath = os.path.join(root_dir, 'alerts.json')
+        with open(json_filepath, 'w') as f:
+            f.write(json.dumps({"alerts": [a.__dict__ for a in alerts_list]}, indent=4))
+
+        def load_json():
+            with open(json_filepath) as f:
+                json.loads(f.read())
+
+        # A day of runs in the snapshot log
+        snapshot_log = SnapshotLog(os.path.join(root_dir, 'snapshots'))
+        start_dt = datetime.datetime(2013, 10, 10)
+        start = time.time()
+        for i in range(RUNS_PER_DAY):
+            snapshot_log.append(start_dt + datetime.timedelta(minutes=5 * i), alerts_list)
+        append_time = (time.time() - start) / RUNS_PER_DAY
+
+        snapshot_size = os.path.getsize(snapshot_log.get_log_filepaths()[0]) / RUNS_PER_DAY
+
+        print "%d alerts" % alerts_count
+        print "%-32s %10s %10s" % ("", "ms", "bytes")
+        print "%-32s %10.1f %10d" % ("load alerts.json", best_time(load_json) * 1000,
+            os.path.getsize(json_filepath))
+        print "%-32s %10.1f %10d" % ("load latest snapshot", best_time(snapshot_log.read_latest) * 1000,
+            snapshot_size)
+        print "%-32s %10.1f" % ("append snapshot", append_time * 1000)
+        print "%-32s %10.1f" % ("event counts over %d runs" % RUNS_PER_DAY,
+            best_time(lambda: snapshot_log.event_counts_history(RUNS_PER_DAY), runs=1) * 1000)
+    finally:
+        shutil.rmtree(root_dir)
@@ -0,0 +1,80 @@
+"""
+Builds synthetic alerts that look like the ones parse.py produces, using the
+real county and zone data, for the benchmarks.
+"""
+
+import hashlib
+import math
+import random
+
+from lib.parser import Parser
+
+EVENTS = ["Tornado Warning", "Flood Watch", "Winter Storm Warning", "Special Weather Statement",
+    "Severe Thunderstorm Warning", "Heat Advisory", "Wind Advisory", "Red Flag Warning"]
+SEVERITIES = ["Extreme", "Severe", "Moderate", "Minor", "Unknown"]
+
+DESCRIPTION = "THE NATIONAL WEATHER SERVICE HAS ISSUED A WARNING FOR THE FOLLOWING AREAS. " * 20
+
+def create_polygon(lng, lat, vertices_count=8):
+    """
+    Returns a closed, slightly ragged ring of vertices around a point, like a
+    warning polygon drawn along county lines and rivers.
+    """
+    polygon = []
+    for i in range(vertices_count):
+        angle = 2 * math.pi * i / vertices_count
+        radius = 0.3 + random.uniform(-0.005, 0.005)
+        polygon.append([lng + radius * math.cos(angle), lat + radius * math.sin(angle)])
+    polygon.append(polygon[0])
+    return polygon
+
+def create_alerts(parser, alerts_count, seed=1, polygon_vertices=8):
+    """
+    Returns a list of fully populated alerts.
+    """
+
+    random.seed(seed)
+    alerts_list = []
+
+    for i in range(alerts_count):
+
+        alert = Parser.Alert()
+        alert.id = "http://alerts.weather.gov/cap/wwacapget.php?x=%d" % i
+        alert.uuid = hashlib.sha1(alert.id).hexdigest()
+        alert.title = "Alert %d issued October 10 at 9:00AM CDT until October 10 at 11:00PM CDT by NWS" % i
+        alert.link = alert.id
+        alert.author = "w-nws.webmaster@noaa.gov"
+        alert.sender = "NWS Wichita (Central Kansas)"
+        alert.status = "Actual"
+        alert.message_type = "Alert"
+        alert.event = random.choice(EVENTS)
+        alert.event_title = alert.event
+        alert.category = "Met"
+        alert.urgency = "Expected"
+        alert.severity = random.choice(SEVERITIES)
+        alert.certainty = "Likely"
+        alert.timezone = "CDT"
+        alert.updated = "2013-10-10T15:%02d:00+00:00" % (i % 60)
+        alert.published = "2013-10-10T14:00:00+00:00"
+        alert.effective = "2013-10-10T14:00:00+00:00"
+        alert.expires = "2013-10-11T04:00:00+00:00"
+        alert.region = "Central Kansas"
+
+        alert.counties = random.sample(parser.counties_list, random.randint(1, 6))
+        alert.ugc_zones = random.sample(parser.ugc_zones_list, random.randint(0, 4))
+        alert.ugc_codes_list = [z['state'] + 'Z' + z['zone'] for z in alert.ugc_zones] + \
+            [c['ugc'][0:2] + 'C' + c['ugc'][2:] for c in alert.counties]
+        alert.states = list(set([parser.state_abbrs_dict[c['state']]['name'] for c in alert.counties
+            if c['state'] in parser.state_abbrs_dict]))
+
+        alert.area_description = "; ".join(c['name'] for c in alert.counties)
+        alert.polygon = create_polygon(alert.counties[0]['lng'], alert.counties[0]['lat'], polygon_vertices) if i % 2 else []
+        alert.summary = DESCRIPTION[:200]
+        alert.instruction = "Move to an interior room on the lowest floor of a sturdy building."
+        alert.description = DESCRIPTION
+        alert.note = ""
+        alert.partial = False
+
+        alerts_list.append(alert)
+
+    return alerts_list
@@ -1,232 +1,264 @@
-import arrow
 import codecs
 import collections
 import json
 import os
 import sys
 
-from jinja2 import Template, Environment, FileSystemLoader
+from lib.writer import OutputWriter
 
 CUR_DIR = os.path.dirname(os.path.realpath(__file__))
 DATA_DIR = os.path.join(CUR_DIR, 'data')
-JSON_DIR = os.path.join(CUR_DIR, 'output/json')
-HTML_DIR = os.path.join(CUR_DIR, 'output/html')
+OUTPUT_DIR = os.path.join(CUR_DIR, 'output')
 
-# Set up the Jinja template engine
-env = Environment()
-env.loader = FileSystemLoader(os.path.join(CUR_DIR, 'templates'))
+def load_json_file(filepath):
+    with codecs.open(filepath, 'r', encoding='UTF-8') as f:
+        return json.loads(f.read())
 
-### Part 1: Filesystem Setup ###
+def load_alerts(output_dir):
+    """
+    Loads the alerts written by parse.py. Returns the created and next update
+    times, the (lite) alerts and the full alerts.
+    """
 
-# Make sure the output directories exist
-for dir_name in ['json/events', 'json/severities', 'json/states', 'json/detail', 'html']:
-    if not os.path.exists(os.path.join(CUR_DIR, 'output/%s' % dir_name)):
-        os.makedirs(os.path.join(CUR_DIR, 'output/%s' % dir_name))
-
-### Part 2: Load up the data from JSON files ###
-
-# Load the full alerts data
-alerts_json_filepath = os.path.join(CUR_DIR, 'output/alerts.json')
-with codecs.open(alerts_json_filepath, 'r', 'utf-8') as f:
-    full_alert_data = json.loads(f.read())
+    # Load the full alerts data
+    full_alert_data = load_json_file(os.path.join(output_dir, 'alerts.json'))
     full_alerts = full_alert_data['alerts']
 
-# Get the alerts (lite) data
-alerts_json_filepath = os.path.join(JSON_DIR, 'alerts.json')
-with codecs.open(alerts_json_filepath, 'r', 'utf-8') as f:
-    alert_data = json.loads(f.read())
+    # Get the alerts (lite) data
+    alert_data = load_json_file(os.path.join(output_dir, 'json/alerts.json'))
     alerts = alert_data['alerts']
 
-# Get the events data
-events_json_filepath = os.path.join(DATA_DIR, 'events.json')
-with codecs.open(events_json_filepath, 'r', encoding='UTF-8') as f:
-    events_data = json.loads(f.read())
-
-# Remove "skippable" events that we don't want to include in the output
-omitted_events = ["911 Telephone Outage", "Child Abduction Emergency", "Law Enforcement Warning", \
-    "Test"]
-for omitted_event in omitted_events:
-    events_data.remove(omitted_event)
-
-# Get the severity data
-severities_json_filepath = os.path.join(DATA_DIR, 'severities.json')
-with codecs.open(severities_json_filepath, 'r', encoding='UTF-8') as f:
-    severities_data = json.loads(f.read())
-
-# Get the states data
-states_json_filepath = os.path.join(DATA_DIR, 'states.json')
-with codecs.open(states_json_filepath, 'r', encoding='UTF-8') as f:
-    states_data = json.loads(f.read())
-
-### Part 4: Write static data files for event types ###
-
-# Create a page for every alert event
-events_dict = {}
-for event in events_data:
-    filtered_alerts = [a for a in alerts if a['event'] == event]
+    return alert_data['created'], alert_data['next_update'], alerts, full_alerts
+
+def create_alert_dicts(alerts_list):
+    """
+    Builds the (lite) and full alert dictionaries straight from the alerts
+    parsed by parse.py, so a pipeline doesn't have to write them out and read
+    them back. The lite alerts have the same fields as json/alerts.json.
+    """
+
+    alerts = []
+    full_alerts = []
+
+    for alert in alerts_list:
+        # The keys are added one at a time, like json.loads does, because
+        # that decides the order json.dumps writes them in
+        alert_dict = {}
+        alert_dict["detail_url"] = "http://wxalerts.org/json/detail/%s.json" % alert.uuid
+        alert_dict["sender"] = alert.sender
+        alert_dict["event"] = alert.event
+        alert_dict["event_title"] = alert.event_title
+        alert_dict["severity"] = alert.severity
+        alert_dict["expires"] = alert.expires
+        alert_dict["region"] = alert.region
+        alert_dict["states"] = alert.states
+        alert_dict["area_description"] = alert.area_description
+        alerts.append(alert_dict)
+        full_alerts.append(alert.__dict__)
+
+    return alerts, full_alerts
+
+def write_json_pages(writer, created, next_update, alerts, full_alerts):
+    """
+    Writes the event, severity, state and location files into the json tree
+    staged by the writer.
+    """
+
+    ### Part 1: Load up the data from JSON files ###
+
+    # Get the events data
+    events_data = load_json_file(os.path.join(DATA_DIR, 'events.json'))
+
+    # Remove "skippable" events that we don't want to include in the output
+    omitted_events = ["911 Telephone Outage", "Child Abduction Emergency", "Law Enforcement Warning", \
+        "Test"]
+    for omitted_event in omitted_events:
+        events_data.remove(omitted_event)
+
+    # Get the severity data
+    severities_data = load_json_file(os.path.join(DATA_DIR, 'severities.json'))
+
+    # Get the states data
+    states_data = load_json_file(os.path.join(DATA_DIR, 'states.json'))
+
+    ### Part 2: Write static data files for event types ###
+
+    # Create a page for every alert event
+    events_dict = {}
+    for event in events_data:
+        filtered_alerts = [a for a in alerts if a['event'] == event]
+        output_dict = {
+            "created": created,
+            "next_update": next_update,
+            "alerts_count": len(filtered_alerts),
+            "alerts": filtered_alerts,
+        }
+        events_dict[event] = len(filtered_alerts)
+        filename = event.lower().replace(" ", "_")
+        writer.write('events/%s.json' % filename, json.dumps(output_dict, indent=4))
+
+    # Write out a static list of all event types with counts
+    ordered_events = collections.OrderedDict(sorted(events_dict.items()))
+    output_dict = {
+        "created": created,
+        "next_update": next_update,
+        "events": ordered_events,
+    }
+    writer.write('events.json', json.dumps(output_dict, indent=4))
+
+
+    ### Part 3: Write static data files for severities ###
+
+    # Create a page for every alert severity
+    severities_dict = {}
+    for severity in severities_data:
+        filtered_alerts = [a for a in alerts if a['severity'] == severity]
+        output_dict = {
+            "created": created,
+            "next_update": next_update,
+            "alerts_count": len(filtered_alerts),
+            "alerts": filtered_alerts,
+        }
+        severities_dict[severity] = len(filtered_alerts)
+        filename = severity.lower().replace(" ", "_")
+        writer.write('severities/%s.json' % filename, json.dumps(output_dict, indent=4))
+
+    # Write out a static list of all severities with counts
+    ordered_severities = collections.OrderedDict(sorted(severities_dict.items()))
     output_dict = {
-        "created": alert_data['created'],
-        "next_update": alert_data['next_update'],
-        "alerts_count": len(filtered_alerts),
-        "alerts": filtered_alerts,
+        "created": created,
+        "next_update": next_update,
+        "serverities": ordered_severities,
     }
-    events_dict[event] = len(filtered_alerts)
-    filename = event.lower().replace(" ", "_")
-    filepath = os.path.join(JSON_DIR, 'events/%s.json' % filename)
-    with codecs.open(filepath, 'w', encoding='UTF-8') as f:
-        f.write(json.dumps(output_dict, indent=4))
-
-# Write out a static list of all event types with counts
-filepath = os.path.join(JSON_DIR, 'events.json')
-ordered_events = collections.OrderedDict(sorted(events_dict.items()))
-output_dict = {
-    "created": alert_data['created'],
-    "next_update": alert_data['next_update'],
-    "events": ordered_events,
-}
-with codecs.open(filepath, 'w', encoding='UTF-8') as f:
-    f.write(json.dumps(output_dict, indent=4))
-
-
-### Part 5: Write static data files for severities ###
-
-# Create a page for every alert severity
-severities_dict = {}
-for severity in severities_data:
-    filtered_alerts = [a for a in alerts if a['severity'] == severity]
+    writer.write('severities.json', json.dumps(output_dict, indent=4))
+
+
+    ### Part 4: Write static data files for states ###
+
+    # Create a page for every alert state
+    states_dict = {}
+    for state in states_data:
+        filtered_alerts = [a for a in alerts if state['name'] in a['states']]
+        output_dict = {
+            "created": created,
+            "next_update": next_update,
+            "alerts_count": len(filtered_alerts),
+            "alerts": filtered_alerts,
+        }
+        states_dict[state['name']] = len(filtered_alerts)
+        filename = state['name'].lower().replace(" ", "_")
+        writer.write('states/%s.json' % filename, json.dumps(output_dict, indent=4))
+
+    # Write out the states dict
+    ordered_states = collections.OrderedDict(sorted(states_dict.items()))
     output_dict = {
-        "created": alert_data['created'],
-        "next_update": alert_data['next_update'],
-        "alerts_count": len(filtered_alerts),
-        "alerts": filtered_alerts,
+        "created": created,
+        "next_update": next_update,
+        "states": ordered_states,
     }
-    severities_dict[severity] = len(filtered_alerts)
-    filename = severity.lower().replace(" ", "_")
-    filepath = os.path.join(JSON_DIR, 'severities/%s.json' % filename)
-    with codecs.open(filepath, 'w', encoding='UTF-8') as f:
-        f.write(json.dumps(output_dict, indent=4))
-
-# Write out a static list of all severities with counts
-filepath = os.path.join(JSON_DIR, 'severities.json')
-ordered_severities = collections.OrderedDict(sorted(severities_dict.items()))
-output_dict = {
-    "created": alert_data['created'],
-    "next_update": alert_data['next_update'],
-    "serverities": ordered_severities,
-}
-with codecs.open(filepath, 'w', encoding='UTF-8') as f:
-    f.write(json.dumps(output_dict, indent=4))
-
-
-### Part 6: Write static data files for states ###
-
-# Create a page for every alert state
-states_dict = {}
-for state in states_data:
-    filtered_alerts = [a for a in alerts if state['name'] in a['states']]
+    writer.write('states.json', json.dumps(output_dict, indent=4))
+
+
+    ### Part 5: Write static data file for locations
+
+    # We have to reach into the full alerts to get the counties for each
+    # alert and then the centroid lat/lng for each county
+    located_alerts = []
+    for alert in full_alerts:
+        located_alerts.append({
+            "detail_url": "http://wxalerts.org/json/detail/%s.json" % alert['uuid'],
+            "sender": alert['sender'],
+            "event": alert['event'],
+            "severity": alert['severity'],
+            "expires": alert['expires'],
+            "states": alert['states'],
+            "coordinates": [(c['lng'], c['lat']) for c in alert['counties']],
+        })
+
     output_dict = {
-        "created": alert_data['created'],
-        "next_update": alert_data['next_update'],
-        "alerts_count": len(filtered_alerts),
-        "alerts": filtered_alerts,
+        "created": created,
+        "next_update": next_update,
+        "alerts": located_alerts,
     }
-    states_dict[state['name']] = len(filtered_alerts)
-    filename = state['name'].lower().replace(" ", "_")
-    filepath = os.path.join(JSON_DIR, 'states/%s.json' % filename)
-    with codecs.open(filepath, 'w', encoding='UTF-8') as f:
-        f.write(json.dumps(output_dict, indent=4))
-
-# Write out the states dict
-filepath = os.path.join(JSON_DIR, 'states.json')
-ordered_states = collections.OrderedDict(sorted(states_dict.items()))
-output_dict = {
-    "created": alert_data['created'],
-    "next_update": alert_data['next_update'],
-    "states": ordered_states,
-}
-with codecs.open(filepath, 'w', encoding='UTF-8') as f:
-    f.write(json.dumps(output_dict, indent=4))
-
-
-### Part 7: Write static data file for locations
-filepath = os.path.join(JSON_DIR, 'locations.json')
-
-# We have to reach into the full alerts to get the counties for each 
-# alert and then the centroid lat/lng for each county
-located_alerts = []
-for alert in full_alerts:
-    located_alerts.append({
-        "detail_url": "http://wxalerts.org/json/detail/%s.json" % alert['uuid'],
-        "sender": alert['sender'],
-        "event": alert['event'],
-        "severity": alert['severity'],
-        "expires": alert['expires'],
-        "states": alert['states'],
-        "coordinates": [(c['lng'], c['lat']) for c in alert['counties']],
-    })
-
-output_dict = {
-    "created": alert_data['created'],
-    "next_update": alert_data['next_update'],
-    "alerts": located_alerts,
-}
-with codecs.open(filepath, 'w', encoding='UTF-8') as f:
-    f.write(json.dumps(output_dict, indent=4))
-
-
-### Part 8: Write static HTML file for alerts
-
-# Load the state abbreviations
-states = {}
-for state_dict in states_data:
-    states[state_dict['abbr']] = state_dict['name']
-
-# Write out the events html file
-template = env.get_template('events.tpl.html')
-created = arrow.get(alert_data['created'])
-output = template.render(alerts=full_alerts, created=created)
-
-output_filepath = os.path.join(HTML_DIR, 'events.html')
-with codecs.open(output_filepath, 'w', 'utf-8') as f:
-    f.write(output)
-
-
-### Part 9: Write static HTML file for states
-
-# Loop through the alerts and get the state(s) it applies to.
-# Keep a list, by state, of all the alerts.
-alerts_by_state = {}
-for alert in full_alerts:
-    # First we need to get a set of all the states this alert
-    # applies to. We can create an array and then run a set operation
-    # to remove duplicates.
-    state_abbrs = []
-    for county in alert['counties']:
-        state_abbrs.append(county['state'])
-    # Now that we have a unique list of states, we need to look up the full
-    # state name. That will be the key that we store the alerts by.
-    for abbr in list(set(state_abbrs)):
-        state_name = states[abbr]
-        if not alerts_by_state.has_key(state_name):
-            alerts_by_state[state_name] = []
-        # Add the alert to each state it applies to.
-        alerts_by_state[state_name].append(alert)
-
-template = env.get_template('states.tpl.html')
-created = arrow.get(alert_data['created'])
-output = template.render(states=alerts_by_state, created=created, count=len(full_alerts))
-
-output_filepath = os.path.join(HTML_DIR, 'states.html')
-with codecs.open(output_filepath, 'w', 'utf-8') as f:
-    f.write(output)
-
-### Part 10: Write static HTML file for severities
-
-# Write out the severities html file
-template = env.get_template('severities.tpl.html')
-created = arrow.get(alert_data['created'])
-output = template.render(alerts=full_alerts, created=created)
-
-output_filepath = os.path.join(HTML_DIR, 'severities.html')
-with codecs.open(output_filepath, 'w', 'utf-8') as f:
-    f.write(output)
+    writer.write('locations.json', json.dumps(output_dict, indent=4))
+
+def write_html_pages(writer, created, full_alerts):
+    """
+    Writes the event, state and severity HTML pages into the html tree staged
+    by the writer.
+    """
+
+    # Arrow and Jinja are only used for the HTML pages, so we load them here
+    # rather than at startup
+    import arrow
+    from jinja2 import Environment, FileSystemLoader
+
+    # Set up the Jinja template engine
+    env = Environment()
+    env.loader = FileSystemLoader(os.path.join(CUR_DIR, 'templates'))
+
+    ### Part 6: Write static HTML file for alerts
+
+    # Load the state abbreviations
+    states_data = load_json_file(os.path.join(DATA_DIR, 'states.json'))
+    states = {}
+    for state_dict in states_data:
+        states[state_dict['abbr']] = state_dict['name']
+
+    # Write out the events html file
+    template = env.get_template('events.tpl.html')
+    created = arrow.get(created)
+    output = template.render(alerts=full_alerts, created=created)
+
+    writer.write('events.html', output)
+
+
+    ### Part 7: Write static HTML file for states
+
+    # Loop through the alerts and get the state(s) it applies to.
+    # Keep a list, by state, of all the alerts.
+    alerts_by_state = {}
+    for alert in full_alerts:
+        # First we need to get a set of all the states this alert
+        # applies to. We can create an array and then run a set operation
+        # to remove duplicates.
+        state_abbrs = []
+        for county in alert['counties']:
+            state_abbrs.append(county['state'])
+        # Now that we have a unique list of states, we need to look up the full
+        # state name. That will be the key that we store the alerts by.
+        for abbr in list(set(state_abbrs)):
+            state_name = states[abbr]
+            if not alerts_by_state.has_key(state_name):
+                alerts_by_state[state_name] = []
+            # Add the alert to each state it applies to.
+            alerts_by_state[state_name].append(alert)
+
+    template = env.get_template('states.tpl.html')
+    output = template.render(states=alerts_by_state, created=created, count=len(full_alerts))
+
+    writer.write('states.html', output)
+
+    ### Part 8: Write static HTML file for severities
+
+    # Write out the severities html file
+    template = env.get_template('severities.tpl.html')
+    output = template.render(alerts=full_alerts, created=created)
+
+    writer.write('severities.html', output)
+
+if __name__ == "__main__":
+
+    created, next_update, alerts, full_alerts = load_alerts(OUTPUT_DIR)
+
+    # The json and html directories are each staged and published in one step,
+    # so readers never see a mix of old and new pages
+    json_writer = OutputWriter(OUTPUT_DIR, 'json')
+    json_writer.begin()
+    write_json_pages(json_writer, created, next_update, alerts, full_alerts)
+    json_writer.publish()
+
+    html_writer = OutputWriter(OUTPUT_DIR, 'html')
+    html_writer.begin()
+    write_html_pages(html_writer, created, full_alerts)
+    html_writer.publish()
@@ -0,0 +1,145 @@
+import collections
+import httplib
+import random
+import time
+import urllib2
+
+class CAPFetcher():
+    """
+    Requests the CAP documents for new alerts. Every request has a deadline
+    that covers all of its retries, failed requests are retried a limited
+    number of times with a jittered backoff, and a circuit breaker stops
+    fetching for the rest of the run once too many recent requests failed,
+    so one slow or broken NOAA host can't stall the whole cycle.
+    """
+
+    # Read responses in chunks so the deadline is checked while a slow server
+    # is still sending
+    CHUNK_SIZE = 16 * 1024
+
+    # HTTP errors that are worth trying again, anything else (like a 404)
+    # won't be fixed by asking again
+    RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, timeout=10, deadline=20, retries=2, backoff=1.0, pause=0.5,
+        error_threshold=0.6, window_size=10, min_requests=5):
+
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.pause = pause
+
+        # The circuit opens when at least error_threshold of the last
+        # window_size requests failed, once there have been min_requests
+        self.error_threshold = error_threshold
+        self.min_requests = min_requests
+        self.recent_results = collections.deque(maxlen=window_size)
+        self.circuit_open = False
+
+        # Counters for the end of run summary
+        self.fetched_count = 0
+        self.failed_count = 0
+        self.retry_count = 0
+        self.skipped_count = 0
+
+        self.last_request_time = None
+
+    ### Custom Exceptions ###
+
+    class FetchError(Exception):
+        def __init__(self, value):
+            self.value = value
+        def __str__(self):
+            return repr(self.value)
+
+    class CircuitOpenError(FetchError):
+        pass
+
+    ### Fetching Methods ###
+
+    def fetch(self, url):
+        """
+        Returns the contents of the url. Raises a FetchError if the request
+        still failed after its retries, or a CircuitOpenError without making
+        a request if the circuit breaker has tripped.
+        """
+
+        if self.circuit_open:
+            self.skipped_count += 1
+            raise self.CircuitOpenError("Circuit breaker is open, not requesting %s" % url)
+
+        deadline = time.time() + self.deadline
+        attempt = 0
+
+        while True:
+            try:
+                contents = self.request(url, deadline)
+                self.fetched_count += 1
+                self.record_result(True)
+                return contents
+            except self.FetchError as e:
+                error, retryable = e, False
+            except urllib2.HTTPError as e:
+                error, retryable = e, e.code in self.RETRYABLE_STATUS_CODES
+            except ValueError as e:
+                # urlopen raises this for an empty or malformed url, asking
+                # again won't help
+                error, retryable = e, False
+            except (IOError, httplib.HTTPException) as e:
+                # URLError, socket timeouts and dropped connections
+                error, retryable = e, True
+
+            # Full jitter, so retries from a busy run don't line up
+            delay = random.uniform(0, self.backoff * (2 ** attempt))
+            if not retryable or attempt >= self.retries or time.time() + delay >= deadline:
+                break
+
+            time.sleep(delay)
+            attempt += 1
+            self.retry_count += 1
+
+        self.failed_count += 1
+        self.record_result(False)
+        raise self.FetchError("%s after %d attempts (%s)" % (url, attempt + 1, error))
+
+    def request(self, url, deadline):
+
+        # Pause between requests to keep from overwhelming NOAA's servers
+        if self.last_request_time is not None:
+            wait = self.last_request_time + self.pause - time.time()
+            if wait > 0:
+                time.sleep(wait)
+        self.last_request_time = time.time()
+
+        timeout = min(self.timeout, max(deadline - time.time(), 0.1))
+        f = urllib2.urlopen(url, timeout=timeout)
+        try:
+            chunks = []
+            while True:
+                chunk = f.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                if time.time() > deadline:
+                    raise self.FetchError("Deadline passed while reading %s" % url)
+            return "".join(chunks)
+        finally:
+            f.close()
+
+    ### Circuit Breaker Methods ###
+
+    def record_result(self, succeeded):
+        self.recent_results.append(succeeded)
+        if len(self.recent_results) < self.min_requests:
+            return
+        error_rate = self.recent_results.count(False) / float(len(self.recent_results))
+        if error_rate >= self.error_threshold:
+            self.circuit_open = True
+
+    def get_summary(self):
+        summary = "Fetched %d CAP documents (%d retries, %d failed, %d skipped)" % (self.fetched_count,
+            self.retry_count, self.failed_count, self.skipped_count)
+        if self.circuit_open:
+            summary += ", circuit breaker opened"
+        return summary
@@ -0,0 +1,189 @@
+import codecs
+import json
+import os
+
+from lib.writer import write_file_atomically
+
+def simplify_line(points, tolerance):
+    """
+    Simplifies a line with the Douglas-Peucker algorithm, dropping vertices
+    that are closer than tolerance (in degrees) to the simplified line.
+    """
+
+    if len(points) < 3:
+        return list(points)
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    tolerance_squared = tolerance * tolerance
+
+    # Use a stack instead of recursion so long lines can't hit the recursion limit
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = points[first]
+        dx = points[last][0] - x1
+        dy = points[last][1] - y1
+        length_squared = float(dx * dx + dy * dy)
+
+        # Find the vertex furthest from the segment between first and last. The
+        # distance math is inlined because this loop is where all the time goes.
+        max_distance = 0.0
+        max_index = None
+        for i in range(first + 1, last):
+            px = points[i][0] - x1
+            py = points[i][1] - y1
+            if length_squared > 0:
+                t = (px * dx + py * dy) / length_squared
+                if t < 0.0:
+                    t = 0.0
+                elif t > 1.0:
+                    t = 1.0
+                px -= t * dx
+                py -= t * dy
+            distance = px * px + py * py
+            if distance > max_distance:
+                max_distance = distance
+                max_index = i
+
+        if max_index is not None and max_distance > tolerance_squared:
+            keep[max_index] = True
+            stack.append((first, max_index))
+            stack.append((max_index, last))
+
+    return [p for p, k in zip(points, keep) if k]
+
+def round_coords(points, precision):
+    return [[round(p[0], precision), round(p[1], precision)] for p in points]
+
+def simplify_polygon(points, tolerance, precision):
+    """
+    Returns a simplified, rounded and closed ring for a polygon, or None if
+    there aren't enough distinct vertices left to make one.
+    """
+
+    ring = round_coords(points, precision)
+    if ring and ring[0] != ring[-1]:
+        ring.append(ring[0])
+
+    simplified = simplify_line(ring, tolerance)
+
+    # A closed ring needs at least three distinct vertices
+    if len(simplified) < 4:
+        simplified = ring
+    if len(simplified) < 4:
+        return None
+    return simplified
+
+def bbox_to_ring(bbox, precision):
+    min_lng, min_lat, max_lng, max_lat = [round(v, precision) for v in bbox]
+    return [[min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat], [min_lng, max_lat], [min_lng, min_lat]]
+
+class GeometryExporter():
+    """
+    Builds a GeoJSON FeatureCollection with one feature per alert. Alerts with
+    a polygon get the simplified polygon; the others get the bounding boxes of
+    their counties and zones.
+
+    Serialized features are cached by uuid, so on the next run only the alerts
+    that were added or updated have to be built again.
+    """
+
+    # Bump this whenever the way features are built changes, so cached
+    # features built the old way aren't reused
+    CACHE_VERSION = 2
+
+    def __init__(self, cache_filepath, ugc_zones_dict, tolerance=0.01, precision=3):
+        self.cache_filepath = cache_filepath
+        self.ugc_zones_dict = ugc_zones_dict
+        self.tolerance = tolerance
+        self.precision = precision
+
+        # The cache is only valid for the settings it was built with
+        self.settings_key = "%d:%s:%s" % (self.CACHE_VERSION, tolerance, precision)
+
+        self.cache = {}
+        if os.path.exists(cache_filepath):
+            with codecs.open(cache_filepath, 'r', 'UTF-8') as f:
+                try:
+                    cache_data = json.loads(f.read())
+                    if cache_data['settings'] == self.settings_key:
+                        self.cache = cache_data['features']
+                except (ValueError, KeyError):
+                    # Rebuild everything rather than fail the run over a bad cache
+                    pass
+
+    def create_geometry(self, alert):
+
+        if alert.polygon:
+            ring = simplify_polygon(alert.polygon, self.tolerance, self.precision)
+            if ring is not None:
+                return {"type": "Polygon", "coordinates": [ring]}, "polygon"
+
+        # Fall back to the boxes of the counties and zones the alert covers.
+        # alert.ugc_zones also has a match for every county code (CTC011 ends
+        # up as zone CT011), so look up the zone codes ourselves.
+        areas = list(alert.counties)
+        for ugc_code in alert.ugc_codes_list:
+            if len(ugc_code) == 6 and ugc_code[2:3] == "Z":
+                zone = self.ugc_zones_dict.get(ugc_code[0:2] + ugc_code[3:])
+                if zone is not None:
+                    areas.append(zone)
+
+        rings = []
+        for area in areas:
+            ring = bbox_to_ring(area['bbox'], self.precision)
+            if ring not in rings:
+                rings.append(ring)
+
+        if not rings:
+            return None, "none"
+        return {"type": "MultiPolygon", "coordinates": [[r] for r in rings]}, "bbox"
+
+    def create_feature(self, alert):
+        geometry, geometry_source = self.create_geometry(alert)
+        feature = {
+            "type": "Feature",
+            "id": alert.uuid,
+            "geometry": geometry,
+            "properties": {
+                "detail_url": "http://wxalerts.org/json/detail/%s.json" % alert.uuid,
+                "event": alert.event,
+                "event_title": alert.event_title,
+                "severity": alert.severity,
+                "expires": alert.expires,
+                "geometry_source": geometry_source,
+            },
+        }
+        return json.dumps(feature, separators=(',', ':'), sort_keys=True)
+
+    def export(self, alerts_list):
+        """
+        Returns the serialized FeatureCollection for the alerts and the number
+        of features that had to be built (rather than taken from the cache).
+        The cache is saved with only the current alerts in it.
+        """
+
+        features = []
+        new_cache = {}
+        built_count = 0
+
+        for alert in alerts_list:
+            # A partial alert keeps its updated time when its CAP document
+            # arrives on a later run, but its event title can change then
+            cached = self.cache.get(alert.uuid)
+            if cached is not None and cached['updated'] == alert.updated and \
+                cached.get('partial') == alert.partial:
+                feature = cached['feature']
+            else:
+                feature = self.create_feature(alert)
+                built_count += 1
+            new_cache[alert.uuid] = {'updated': alert.updated, 'partial': alert.partial, 'feature': feature}
+            features.append(feature)
+
+        self.cache = new_cache
+        cache_data = {'settings': self.settings_key, 'features': new_cache}
+        write_file_atomically(json.dumps(cache_data), self.cache_filepath)
+
+        output = '{"type":"FeatureCollection","features":[%s]}' % ",".join(features)
+        return output, built_count
@@ -0,0 +1,74 @@
+import json
+
+class AlertIndex():
+    """
+    An inverted index from county FIPS codes and UGC zone codes to the uuids
+    of the alerts that apply there. The index is written as small JSON shards
+    bucketed by state, for example index/counties/KS.json, so a client can
+    fetch the alerts for a single county or zone without downloading a whole
+    state file.
+    """
+
+    def __init__(self):
+        # Each kind of index maps state abbreviation -> code -> set of uuids
+        self.shards = {
+            'counties': {},
+            'zones': {},
+        }
+
+    def add_uuid(self, kind, state_abbr, code, uuid):
+        codes_dict = self.shards[kind].setdefault(state_abbr, {})
+        codes_dict.setdefault(code, set()).add(uuid)
+
+    def add(self, alert):
+        """
+        Adds an alert using the counties and UGC codes that were resolved for it.
+        """
+
+        for county in alert.counties:
+            self.add_uuid('counties', county['state'], county['fips'], alert.uuid)
+
+        # The UGC codes list has both zone codes (KSZ083) and county codes
+        # (KSC083). Only the zone codes go in the zone index; alert.ugc_zones
+        # can't be used because its lookup drops the Z/C and would match county
+        # codes to unrelated zones.
+        for ugc_code in alert.ugc_codes_list:
+            if len(ugc_code) == 6 and ugc_code[2:3] == "Z":
+                self.add_uuid('zones', ugc_code[0:2], ugc_code, alert.uuid)
+
+    def render_shard(self, kind, codes_dict):
+        # Sort everything so an unchanged shard renders to the same bytes and
+        # doesn't get rewritten
+        output_dict = {}
+        for code, uuids in codes_dict.items():
+            output_dict[code] = sorted(uuids)
+        return json.dumps({kind: output_dict}, indent=4, sort_keys=True)
+
+    def write_shards(self, writer):
+        """
+        Writes the shards that changed since the previous run through the
+        OutputWriter. Shards for states that no longer have any alerts are
+        emptied rather than removed. Returns the number of shards written and
+        the total number of shards.
+        """
+
+        written_count = 0
+        total_count = 0
+
+        for kind, shards_dict in self.shards.items():
+
+            directory = 'index/%s' % kind
+
+            # Include the shards from previous runs so they get emptied
+            previous_abbrs = [n[:-len('.json')] for n in writer.list_files(directory) if n.endswith('.json')]
+            state_abbrs = set(shards_dict.keys()) | set(previous_abbrs)
+
+            for state_abbr in state_abbrs:
+                relpath = '%s/%s.json' % (directory, state_abbr)
+                contents = self.render_shard(kind, shards_dict.get(state_abbr, {}))
+                total_count += 1
+                if writer.read(relpath) != contents:
+                    writer.write(relpath, contents)
+                    written_count += 1
+
+        return written_count, total_count
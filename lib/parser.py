@@ -5,10 +5,10 @@ import json
 import lxml
 import os
 import pytz
-import shapely.geometry
 import sys
 
 from lxml import etree as ET
+from lib.writer import write_file_atomically
 
 class Parser():
 
@@ -20,14 +20,10 @@ class Parser():
         self.json_dir = os.path.join(self.output_dir, 'json/')
         self.detail_dir = os.path.join(self.json_dir, 'detail/')
 
-        # Make sure the output directories exist
+        # Make sure the output directories exist. The json directory is created
+        # by the OutputWriter when the first run is published.
         self.ensure_directory_exists(self.output_dir)
         self.ensure_directory_exists(self.logs_dir)
-        self.ensure_directory_exists(self.json_dir)
-        self.ensure_directory_exists(os.path.join(self.json_dir, 'detail'))
-        self.ensure_directory_exists(os.path.join(self.json_dir, 'events'))
-        self.ensure_directory_exists(os.path.join(self.json_dir, 'severities'))
-        self.ensure_directory_exists(os.path.join(self.json_dir, 'states'))
 
         # Load states
         states_filepath = os.path.join(self.data_dir, 'states.json')
@@ -64,6 +60,9 @@ class Parser():
         skippable_events_filepath = os.path.join(self.data_dir, 'skippable_events.json')
         self.skippable_events_list = self.load_json(skippable_events_filepath)
 
+        # The alerts from the previous run, if there was one
+        self.previous_alerts_list = []
+
     ### Custom Objects ###
     
     class Alert():
@@ -146,14 +145,16 @@ class Parser():
 
     def save_bad_xml(self, file_contents):
         now_utc = datetime.datetime.now(pytz.utc)
-        time_str = now_utc.strftime('%Y%m%d_%H%M%S')
+        time_str = now_utc.strftime('%Y%m%d_%H%M%S_%f')
         filepath = os.path.join(self.logs_dir, 'bad_alert_%s.xml' % time_str)
-        with codecs.open(log_filepath, 'a', 'UTF-8') as f:
-            f.write("%s\t%s\n\n" % (now_utc, message))
+        # Keep the bytes exactly as they were received
+        with open(filepath, 'wb') as f:
+            f.write(file_contents)
     
     def write_contents_to_filepath(self, contents, filepath):
-        with codecs.open(filepath, 'w', 'UTF-8') as f:
-           f.write(contents)
+        # Write to a temporary file and rename it into place so a reader never
+        # sees a half-written file
+        write_file_atomically(contents, filepath)
 
     def ensure_directory_exists(self, directory_path):
         if not os.path.exists(directory_path):
@@ -179,8 +180,8 @@ class Parser():
         try:
             tree = ET.fromstring(contents)
             return tree
-        except lxml.etree.XMLSyntaxError:
-            raise self.XMLError("Error Loading XML from URL: %s" % url)
+        except lxml.etree.XMLSyntaxError as e:
+            raise self.XMLError("Error Loading XML from URL contents: %s" % e)
 
     ### Geographic Methods ###
 
@@ -193,13 +194,17 @@ class Parser():
         if not self.check_verticies_for_errors(verticies_list):
             return verticies_list
         else:
-            self.log_error("Distance between points was %f in polygon (%s)" % (distance, alert['polygon']))
-            raise GeometryError("A bad point was present in the polygon")
+            self.log_error("Bad point in polygon (%s)" % verticies_string)
+            raise self.GeometryError("A bad point was present in the polygon")
     
     def check_verticies_for_errors(self, verticies_list):
         # Sometimes there is a bad point in the verticies list, this often happens 
         # when a point of 0.0 appears. We check to see if there is a distance of more 
         # than 25 miles between points. If so, we assume an error.
+
+        # Shapely is slow to import, so only load it when we have a polygon to check
+        import shapely.geometry
+
         for point in verticies_list:
             first_point = shapely.geometry.Point(verticies_list[0][0],verticies_list[0][1])
             cur_point = shapely.geometry.Point(point[0], point[1])
@@ -310,11 +315,23 @@ class Parser():
     def find_previous_alert_by_uuid(self, uuid, timestamp):
         for old_alert_dict in self.previous_alerts_list:
             if old_alert_dict['uuid'] == uuid:
+                # If we couldn't get the CAP document for it last time, try again
+                if old_alert_dict.get('partial'):
+                    return None
+                # Alerts saved before the UGC codes were kept can't be indexed
+                # by zone, so parse them again
+                if 'ugc_codes_list' not in old_alert_dict:
+                    return None
                 # If we find the alert, make sure it's the same age
                 if old_alert_dict['updated'] == timestamp:
                     return old_alert_dict
         return None
 
+    def count_changed_alerts(self, alerts_list):
+        # An alert has changed if the previous run didn't have it or had an older version
+        previous_versions = set([(a['uuid'], a['updated']) for a in self.previous_alerts_list])
+        return len([a for a in alerts_list if (a.uuid, a.updated) not in previous_versions])
+
     def refine_weather_statement(self, description):
         """
         We use this method to look inside the description of a Special
@@ -0,0 +1,195 @@
+import calendar
+import codecs
+import datetime
+import json
+import os
+import pytz
+
+class PollScheduler():
+    """
+    Works out how long to wait before polling the alerts feed again. It keeps
+    track of how many alerts were added or updated in recent cycles and polls
+    more often while the feed is busy, down to min_interval. It backs off
+    towards max_interval while the feed is quiet and after errors.
+    """
+
+    def __init__(self, state_filepath=None, churn_log_filepath=None, base_interval=300,
+        min_interval=120, max_interval=600):
+
+        self.state_filepath = state_filepath
+        self.churn_log_filepath = churn_log_filepath
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+        # How many changes we would like to pick up per poll. With a churn rate
+        # of one change a minute, that gives us the base interval.
+        self.target_changes = base_interval / 60.0
+
+        # How many recent cycles we look at to estimate the churn rate
+        self.history_size = 6
+
+        # How much the interval may grow in one cycle when things are quiet,
+        # and how much it grows after an error
+        self.quiet_growth = 1.5
+        self.error_growth = 2.0
+
+        self.cycles = []
+        self.interval = base_interval
+
+        if state_filepath is not None and os.path.exists(state_filepath):
+            with codecs.open(state_filepath, 'r', 'UTF-8') as f:
+                try:
+                    state = json.loads(f.read())
+                    self.cycles = state['cycles']
+                    self.interval = state['interval']
+                except (ValueError, KeyError):
+                    # Start over rather than fail the run over a bad state file
+                    pass
+
+    ### Scheduling Methods ###
+
+    def get_churn_rate(self):
+        """
+        Returns the number of changes per second over the recent cycles.
+        """
+
+        if len(self.cycles) < 2:
+            return None
+
+        # The changes seen in a cycle happened since the cycle before it
+        changes_count = sum([c['changes'] for c in self.cycles[1:] if not c['error']])
+        elapsed = self.cycles[-1]['time'] - self.cycles[0]['time']
+        if elapsed <= 0:
+            return None
+        return changes_count / float(elapsed)
+
+    def record_cycle(self, changes_count, error=False, now=None):
+        """
+        Records the outcome of a poll and returns the number of seconds to wait
+        before the next one. now is a UNIX timestamp and defaults to the
+        current time.
+        """
+
+        if now is None:
+            now = calendar.timegm(datetime.datetime.utcnow().utctimetuple())
+
+        self.cycles.append({'time': now, 'changes': changes_count, 'error': error})
+        self.cycles = self.cycles[-(self.history_size + 1):]
+
+        if error:
+            # Give NOAA's servers some room when they are having trouble
+            interval = self.interval * self.error_growth
+        else:
+            churn_rate = self.get_churn_rate()
+            if churn_rate is None:
+                interval = self.base_interval
+            elif churn_rate > 0:
+                interval = self.target_changes / churn_rate
+            else:
+                interval = self.max_interval
+
+            # Poll sooner as soon as things pick up, but only back off gradually
+            interval = min(interval, self.interval * self.quiet_growth)
+
+        self.interval = int(max(self.min_interval, min(self.max_interval, interval)))
+
+        self.log_cycle(now, changes_count, error)
+
+        return self.interval
+
+    def get_next_update(self, dt_now):
+        return dt_now + datetime.timedelta(seconds=self.interval)
+
+    ### File Handling Methods ###
+
+    def save(self):
+        if self.state_filepath is None:
+            return
+        state = {'cycles': self.cycles, 'interval': self.interval}
+        with codecs.open(self.state_filepath, 'w', 'UTF-8') as f:
+            f.write(json.dumps(state, indent=4))
+
+    def log_cycle(self, now, changes_count, error):
+        # Every cycle is logged so the churn can be replayed with simulate()
+        if self.churn_log_filepath is None:
+            return
+        now_utc = datetime.datetime.fromtimestamp(now, pytz.utc)
+        with codecs.open(self.churn_log_filepath, 'a', 'UTF-8') as f:
+            f.write("%s\t%d\t%d\n" % (now_utc.isoformat(), changes_count, int(error)))
+
+def load_churn_log(filepath):
+    """
+    Loads a churn log written by the scheduler. Returns a list of
+    (timestamp, changes count) for the cycles that didn't fail.
+    """
+
+    # dateutil is only needed to replay logs
+    import dateutil.parser
+
+    timeline = []
+    with codecs.open(filepath, 'r', 'UTF-8') as f:
+        for line in f:
+            parts = line.strip().split("\t")
+            if len(parts) != 3 or parts[2] == '1':
+                continue
+            dt = dateutil.parser.parse(parts[0])
+            timeline.append((calendar.timegm(dt.utctimetuple()), int(parts[1])))
+    return timeline
+
+def expand_timeline(timeline):
+    """
+    Turns recorded (timestamp, changes count) cycles into the times of the
+    individual changes. We only know that the changes of a cycle happened
+    since the cycle before it, so we spread them out evenly over that time.
+    """
+
+    change_times = []
+    for i in range(1, len(timeline)):
+        start, end = timeline[i - 1][0], timeline[i][0]
+        changes_count = timeline[i][1]
+        for j in range(changes_count):
+            change_times.append(start + (end - start) * (j + 1) / float(changes_count))
+    return change_times
+
+def simulate(timeline, scheduler):
+    """
+    Replays a recorded (timestamp, changes count) timeline against a scheduler,
+    polling from the first cycle until the last change has been picked up.
+    Returns a dictionary with the number of polls, the number of requests
+    (one for the feed plus one per changed alert) and how stale the changes
+    were when they were picked up, in seconds.
+    """
+
+    change_times = expand_timeline(timeline)
+    if not change_times:
+        return {'polls': 0, 'requests': 0, 'mean_delay': 0.0, 'p95_delay': 0.0, 'max_delay': 0.0}
+
+    now = timeline[0][0]
+    polls_count = 0
+    delays = []
+    next_change = 0
+
+    # Poll once at the start so the scheduler has something to go on
+    scheduler.record_cycle(0, now=now)
+
+    while next_change < len(change_times) or now < timeline[-1][0]:
+        now += scheduler.interval
+        polls_count += 1
+
+        changes_count = 0
+        while next_change < len(change_times) and change_times[next_change] <= now:
+            delays.append(now - change_times[next_change])
+            changes_count += 1
+            next_change += 1
+
+        scheduler.record_cycle(changes_count, now=now)
+
+    delays.sort()
+    return {
+        'polls': polls_count,
+        'requests': polls_count + len(delays),
+        'mean_delay': sum(delays) / len(delays),
+        'p95_delay': delays[int(len(delays) * 0.95)],
+        'max_delay': delays[-1],
+    }
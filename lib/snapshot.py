@@ -0,0 +1,301 @@
+import array
+import calendar
+import collections
+import datetime
+import dateutil.parser
+import os
+import struct
+import sys
+
+class Snapshot():
+    """
+    The alerts of a single run, stored by column. Events, severities and states
+    are stored as small integers that index into a list of names.
+    """
+
+    def __init__(self, created):
+        self.created = created
+        self.count = 0
+        # uuids are 40 character hex digests, stored packed into 20 bytes each
+        # and only unpacked when asked for
+        self.uuid_bytes = ''
+        self.event_names = []
+        self.event_ids = array.array('H')
+        self.severity_names = []
+        self.severity_ids = array.array('H')
+        self.updated = array.array('d')
+        self.expires = array.array('d')
+        # The states of alert i are state_ids[state_offsets[i]:state_offsets[i+1]]
+        self.state_names = []
+        self.state_offsets = array.array('I', [0])
+        self.state_ids = array.array('H')
+
+    def __len__(self):
+        return self.count
+
+    def get_uuid(self, index):
+        return self.uuid_bytes[index * 20:(index + 1) * 20].encode('hex')
+
+    def get_uuids(self):
+        return [self.get_uuid(i) for i in range(self.count)]
+
+    def count_names(self, names, ids):
+        counts = collections.Counter(ids)
+        return dict((names[i], count) for i, count in counts.items())
+
+    def event_counts(self):
+        return self.count_names(self.event_names, self.event_ids)
+
+    def severity_counts(self):
+        return self.count_names(self.severity_names, self.severity_ids)
+
+    def state_counts(self):
+        return self.count_names(self.state_names, self.state_ids)
+
+    def get_states(self, index):
+        start = self.state_offsets[index]
+        end = self.state_offsets[index + 1]
+        return [self.state_names[i] for i in self.state_ids[start:end]]
+
+class SnapshotLog():
+    """
+    An append-only binary log with one columnar snapshot per run. There is one
+    file per UTC day in the snapshots directory, and each record is framed by
+    its length on both sides:
+
+        [length][payload][length]
+
+    A record that was only partly written (for example because the run was
+    killed) fails the framing check. It is ignored when reading and cut off
+    before the next append.
+    """
+
+    MAGIC = 'NAS1'
+    LENGTH = struct.Struct('<I')
+
+    def __init__(self, snapshots_dir, keep_days=7):
+        self.snapshots_dir = snapshots_dir
+        self.keep_days = keep_days
+        if not os.path.exists(self.snapshots_dir):
+            os.makedirs(self.snapshots_dir)
+
+    ### Encoding Methods ###
+
+    def get_dictionary_id(self, names, ids_dict, name):
+        if name not in ids_dict:
+            ids_dict[name] = len(names)
+            names.append(name)
+        return ids_dict[name]
+
+    def get_timestamp(self, datestr):
+        # Our own dates are always UTC in ISO format (2013-10-10T15:00:00+00:00),
+        # which we can slice up much faster than dateutil can parse them
+        if len(datestr) == 25 and datestr.endswith('+00:00'):
+            return float(calendar.timegm((int(datestr[0:4]), int(datestr[5:7]), int(datestr[8:10]),
+                int(datestr[11:13]), int(datestr[14:16]), int(datestr[17:19]))))
+        dt = dateutil.parser.parse(datestr)
+        return float(calendar.timegm(dt.utctimetuple()))
+
+    def create_snapshot(self, created, alerts_list):
+        """
+        Builds a snapshot from a list of parsed alerts.
+        """
+
+        snapshot = Snapshot(created)
+        snapshot.count = len(alerts_list)
+        snapshot.uuid_bytes = ''.join(alert.uuid.decode('hex') for alert in alerts_list)
+        event_ids_dict = {}
+        severity_ids_dict = {}
+        state_ids_dict = {}
+
+        for alert in alerts_list:
+            snapshot.event_ids.append(self.get_dictionary_id(snapshot.event_names, event_ids_dict, alert.event))
+            snapshot.severity_ids.append(self.get_dictionary_id(snapshot.severity_names, severity_ids_dict, alert.severity))
+            snapshot.updated.append(self.get_timestamp(alert.updated))
+            snapshot.expires.append(self.get_timestamp(alert.expires))
+            for state in alert.states:
+                snapshot.state_ids.append(self.get_dictionary_id(snapshot.state_names, state_ids_dict, state))
+            snapshot.state_offsets.append(len(snapshot.state_ids))
+
+        return snapshot
+
+    def pack_names(self, names):
+        parts = [struct.pack('<I', len(names))]
+        for name in names:
+            encoded = name.encode('UTF-8')
+            parts.append(struct.pack('<H', len(encoded)))
+            parts.append(encoded)
+        return ''.join(parts)
+
+    def unpack_names(self, payload, offset):
+        (count,) = struct.unpack_from('<I', payload, offset)
+        offset += 4
+        names = []
+        for i in range(count):
+            (length,) = struct.unpack_from('<H', payload, offset)
+            offset += 2
+            names.append(payload[offset:offset + length].decode('UTF-8'))
+            offset += length
+        return names, offset
+
+    def pack_array(self, values):
+        # Columns are always stored little-endian
+        if sys.byteorder != 'little':
+            values = array.array(values.typecode, values)
+            values.byteswap()
+        return values.tostring()
+
+    def unpack_array(self, typecode, count, payload, offset):
+        values = array.array(typecode)
+        end = offset + count * values.itemsize
+        values.fromstring(payload[offset:end])
+        if sys.byteorder != 'little':
+            values.byteswap()
+        return values, end
+
+    def encode(self, snapshot):
+        count = len(snapshot)
+        parts = [
+            self.MAGIC,
+            struct.pack('<dII', snapshot.created, count, len(snapshot.state_ids)),
+            self.pack_names(snapshot.event_names),
+            self.pack_names(snapshot.severity_names),
+            self.pack_names(snapshot.state_names),
+            snapshot.uuid_bytes,
+            self.pack_array(snapshot.event_ids),
+            self.pack_array(snapshot.severity_ids),
+            self.pack_array(snapshot.updated),
+            self.pack_array(snapshot.expires),
+            self.pack_array(snapshot.state_offsets),
+            self.pack_array(snapshot.state_ids),
+        ]
+        return ''.join(parts)
+
+    def decode(self, payload):
+        (created, count, states_count) = struct.unpack_from('<dII', payload, 4)
+        offset = 4 + 16
+
+        snapshot = Snapshot(created)
+        snapshot.event_names, offset = self.unpack_names(payload, offset)
+        snapshot.severity_names, offset = self.unpack_names(payload, offset)
+        snapshot.state_names, offset = self.unpack_names(payload, offset)
+
+        snapshot.count = count
+        snapshot.uuid_bytes = payload[offset:offset + count * 20]
+        offset += count * 20
+
+        snapshot.event_ids, offset = self.unpack_array('H', count, payload, offset)
+        snapshot.severity_ids, offset = self.unpack_array('H', count, payload, offset)
+        snapshot.updated, offset = self.unpack_array('d', count, payload, offset)
+        snapshot.expires, offset = self.unpack_array('d', count, payload, offset)
+        snapshot.state_offsets, offset = self.unpack_array('I', count + 1, payload, offset)
+        snapshot.state_ids, offset = self.unpack_array('H', states_count, payload, offset)
+
+        return snapshot
+
+    ### File Methods ###
+
+    def get_log_filepaths(self):
+        """
+        Returns the log files, oldest first.
+        """
+        filenames = sorted([n for n in os.listdir(self.snapshots_dir) if n.endswith('.log')])
+        return [os.path.join(self.snapshots_dir, n) for n in filenames]
+
+    def find_records(self, f):
+        """
+        Returns the (offset, length) of every complete record in an open log file.
+        Only the length fields are read, so this is cheap even for large files.
+        """
+
+        records = []
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell()
+        offset = 0
+        size = self.LENGTH.size
+
+        while offset + size <= file_size:
+            f.seek(offset)
+            (length,) = self.LENGTH.unpack(f.read(size))
+            end = offset + size + length + size
+            if end > file_size:
+                break
+            f.seek(end - size)
+            (trailing_length,) = self.LENGTH.unpack(f.read(size))
+            if trailing_length != length:
+                break
+            records.append((offset + size, length))
+            offset = end
+
+        return records
+
+    def append(self, created_dt, alerts_list):
+        """
+        Appends a snapshot of the alerts to the log for the day of created_dt,
+        which must be in UTC, and removes logs older than keep_days.
+        """
+
+        created = float(calendar.timegm(created_dt.utctimetuple()))
+        payload = self.encode(self.create_snapshot(created, alerts_list))
+        filepath = os.path.join(self.snapshots_dir, '%s.log' % created_dt.strftime('%Y%m%d'))
+
+        mode = 'r+b' if os.path.exists(filepath) else 'w+b'
+        with open(filepath, mode) as f:
+            # Cut off a record that was only partly written by an earlier run
+            records = self.find_records(f)
+            if records:
+                valid_end = records[-1][0] + records[-1][1] + self.LENGTH.size
+            else:
+                valid_end = 0
+            f.seek(valid_end)
+            f.truncate()
+            f.write(self.LENGTH.pack(len(payload)))
+            f.write(payload)
+            f.write(self.LENGTH.pack(len(payload)))
+
+        self.prune(created_dt)
+
+    def prune(self, now_dt):
+        oldest_day = (now_dt - datetime.timedelta(days=self.keep_days)).strftime('%Y%m%d')
+        for filepath in self.get_log_filepaths():
+            if os.path.basename(filepath)[:-len('.log')] < oldest_day:
+                os.unlink(filepath)
+
+    ### Query Methods ###
+
+    def read_last(self, runs_count):
+        """
+        Returns the snapshots of the last runs_count runs, oldest first.
+        """
+
+        snapshots = []
+        if runs_count < 1:
+            return snapshots
+
+        for filepath in reversed(self.get_log_filepaths()):
+            with open(filepath, 'rb') as f:
+                records = self.find_records(f)
+                for offset, length in reversed(records[-(runs_count - len(snapshots)):]):
+                    f.seek(offset)
+                    payload = f.read(length)
+                    if payload[:4] == self.MAGIC:
+                        snapshots.append(self.decode(payload))
+            if len(snapshots) >= runs_count:
+                break
+
+        snapshots.reverse()
+        return snapshots
+
+    def read_latest(self):
+        """
+        Returns the snapshot of the most recent run, or None if there isn't one.
+        """
+        snapshots = self.read_last(1)
+        return snapshots[0] if snapshots else None
+
+    def event_counts_history(self, runs_count):
+        """
+        Returns a list of (created, {event: count}) for the last runs_count
+        runs, oldest first.
+        """
+        return [(s.created, s.event_counts()) for s in self.read_last(runs_count)]
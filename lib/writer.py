@@ -0,0 +1,263 @@
+import datetime
+import errno
+import os
+import shutil
+import time
+
+class OutputWriter():
+    """
+    Writes a whole tree of output files (for example output/json) as a single
+    unit. Files are staged into a new generation directory and the tree is
+    published by swapping a symlink, so readers see either the previous run
+    or this one, never a mix of the two or a half-written file.
+
+    The stage starts out as a hard-linked copy of the current generation, so
+    files that are not rewritten during a run carry over to the next one.
+    """
+
+    # Buffer size used when writing files
+    BUFFER_SIZE = 64 * 1024
+
+    # Stages older than this (in seconds) belong to runs that died before publishing
+    STALE_STAGE_AGE = 60 * 60
+
+    def __init__(self, root_dir, name, keep_generations=3):
+
+        self.root_dir = root_dir
+        self.name = name
+        self.keep_generations = keep_generations
+
+        # The published path (output/json) is a symlink to a generation
+        # directory inside output/generations
+        self.link_path = os.path.join(root_dir, name)
+        self.generations_dir = os.path.join(root_dir, 'generations')
+
+        self.generation = None
+        self.stage_dir = None
+        self.written_files = []
+        self.staged_dirs = set()
+
+    ### Custom Exceptions ###
+
+    class WriterError(Exception):
+        def __init__(self, value):
+            self.value = value
+        def __str__(self):
+            return repr(self.value)
+
+    ### Staging Methods ###
+
+    def begin(self):
+        """
+        Creates the stage directory for this run and seeds it from the
+        currently published generation.
+        """
+
+        if not os.path.exists(self.generations_dir):
+            os.makedirs(self.generations_dir)
+
+        # Generation names sort in the order they were created
+        now_utc = datetime.datetime.utcnow()
+        self.generation = "%s.%s.%d" % (self.name, now_utc.strftime('%Y%m%d%H%M%S%f'), os.getpid())
+        self.stage_dir = os.path.join(self.generations_dir, self.generation + '.tmp')
+        self.written_files = []
+        self.staged_dirs = set([self.stage_dir])
+
+        os.makedirs(self.stage_dir)
+
+        current_dir = self.get_current_dir()
+        if current_dir is not None:
+            self.link_tree(current_dir, self.stage_dir)
+
+    def get_current_dir(self):
+        """
+        Returns the directory that is currently published, or None if there
+        is nothing published yet.
+        """
+        if os.path.isdir(self.link_path):
+            return os.path.realpath(self.link_path)
+        return None
+
+    def link_tree(self, source_dir, dest_dir):
+        # Hard links are cheap to make and leave the previous generation untouched
+        # as long as we never write into a linked file in place
+        for dir_path, dir_names, file_names in os.walk(source_dir):
+            rel_dir = os.path.relpath(dir_path, source_dir)
+            target_dir = os.path.normpath(os.path.join(dest_dir, rel_dir))
+            if not os.path.exists(target_dir):
+                os.makedirs(target_dir)
+            self.add_staged_dir(target_dir)
+            for file_name in file_names:
+                os.link(os.path.join(dir_path, file_name), os.path.join(target_dir, file_name))
+
+    def add_staged_dir(self, directory):
+        # Every directory in the stage has to be synced before publishing, not
+        # just the ones we wrote into, or the links made by link_tree and any
+        # new subdirectories could be lost in a crash after the rename
+        while directory not in self.staged_dirs and directory.startswith(self.stage_dir):
+            self.staged_dirs.add(directory)
+            directory = os.path.dirname(directory)
+
+    def get_stage_path(self, relpath):
+        if self.stage_dir is None:
+            raise self.WriterError("begin() must be called before writing")
+        return os.path.join(self.stage_dir, relpath)
+
+    def write(self, relpath, contents):
+        """
+        Writes the contents to a path relative to the root of the tree. Unicode
+        contents are encoded as UTF-8.
+        """
+
+        filepath = self.get_stage_path(relpath)
+
+        directory = os.path.dirname(filepath)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.add_staged_dir(directory)
+
+        # The file may be a hard link into the published generation, so we have
+        # to break the link rather than truncate the shared file
+        if os.path.exists(filepath):
+            os.unlink(filepath)
+
+        if isinstance(contents, unicode):
+            contents = contents.encode('UTF-8')
+
+        with open(filepath, 'wb', self.BUFFER_SIZE) as f:
+            f.write(contents)
+
+        self.written_files.append(filepath)
+
+    def read(self, relpath):
+        """
+        Returns the staged contents of a file as bytes, or None if it doesn't exist.
+        """
+        filepath = self.get_stage_path(relpath)
+        if not os.path.exists(filepath):
+            return None
+        with open(filepath, 'rb') as f:
+            return f.read()
+
+    def list_files(self, reldir):
+        """
+        Returns the names of the files staged in a directory relative to the root.
+        """
+        directory = self.get_stage_path(reldir)
+        if not os.path.isdir(directory):
+            return []
+        return [n for n in os.listdir(directory) if os.path.isfile(os.path.join(directory, n))]
+
+    def remove(self, relpath):
+        filepath = self.get_stage_path(relpath)
+        if os.path.exists(filepath):
+            os.unlink(filepath)
+
+    ### Publishing Methods ###
+
+    def sync(self):
+        """
+        Flushes everything written this run and every directory in the stage to
+        disk. Doing this in one pass at the end is much cheaper than syncing
+        after every file.
+        """
+
+        for filepath in self.written_files:
+            fsync_path(filepath)
+
+        # Children first, so each directory is synced after the entries in it
+        for directory in sorted(self.staged_dirs, reverse=True):
+            fsync_path(directory)
+
+    def publish(self):
+        """
+        Makes the staged generation the published one and removes old generations.
+        """
+
+        if self.stage_dir is None:
+            raise self.WriterError("begin() must be called before publishing")
+
+        self.sync()
+
+        # Move the stage to its final name
+        generation_dir = os.path.join(self.generations_dir, self.generation)
+        os.rename(self.stage_dir, generation_dir)
+        fsync_path(self.generations_dir)
+
+        # Older installs have a real directory here. Move it out of the way
+        # once so it can be replaced by the symlink from now on.
+        if os.path.isdir(self.link_path) and not os.path.islink(self.link_path):
+            os.rename(self.link_path, os.path.join(self.generations_dir, self.name + '.0.legacy'))
+
+        # Point a temporary symlink at the new generation and rename it over the
+        # published path. The rename is atomic, so readers never see a gap.
+        tmp_link_path = self.link_path + '.tmp'
+        if os.path.lexists(tmp_link_path):
+            os.unlink(tmp_link_path)
+        os.symlink(os.path.relpath(generation_dir, self.root_dir), tmp_link_path)
+        os.rename(tmp_link_path, self.link_path)
+        fsync_path(self.root_dir)
+
+        self.stage_dir = None
+        self.prune()
+
+    def abort(self):
+        """
+        Throws away the staged generation without publishing it.
+        """
+        if self.stage_dir is not None:
+            shutil.rmtree(self.stage_dir, ignore_errors=True)
+            self.stage_dir = None
+
+    def prune(self):
+        # Keep a few old generations around for readers that are still in the
+        # middle of reading them, and remove everything else including the
+        # stages of runs that died before publishing
+        current_dir = self.get_current_dir()
+        prefix = self.name + '.'
+        generations = sorted([n for n in os.listdir(self.generations_dir) if n.startswith(prefix)])
+
+        finished = [n for n in generations if not n.endswith('.tmp')]
+        removable = finished[:-self.keep_generations]
+
+        for generation in generations:
+            if generation.endswith('.tmp'):
+                stage_age = time.time() - os.path.getmtime(os.path.join(self.generations_dir, generation))
+                if stage_age > self.STALE_STAGE_AGE:
+                    removable.append(generation)
+
+        for generation in removable:
+            generation_dir = os.path.join(self.generations_dir, generation)
+            if generation_dir != current_dir:
+                shutil.rmtree(generation_dir, ignore_errors=True)
+
+def fsync_path(path):
+    """
+    Flushes a file or directory to disk.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError as e:
+        # Some filesystems don't allow syncing directories
+        if e.errno not in (errno.EINVAL, errno.EBADF):
+            raise
+    finally:
+        os.close(fd)
+
+def write_file_atomically(contents, filepath):
+    """
+    Replaces a single file so readers see either the old or the new contents.
+    """
+
+    if isinstance(contents, unicode):
+        contents = contents.encode('UTF-8')
+
+    tmp_filepath = "%s.%d.tmp" % (filepath, os.getpid())
+    with open(tmp_filepath, 'wb', OutputWriter.BUFFER_SIZE) as f:
+        f.write(contents)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.rename(tmp_filepath, filepath)
+    fsync_path(os.path.dirname(filepath))
@@ -1,26 +1,34 @@
 import datetime
 import dateutil.parser
-import jinja2
+import httplib
 import json
 import os
 import pytz
-import shapely.geometry
 import sys
 import time
 import urllib2
 
+from lxml import etree as ET
+
+from lib.fetcher import CAPFetcher
+from lib.geometry import GeometryExporter
+from lib.index import AlertIndex
 from lib.parser import Parser
+from lib.scheduler import PollScheduler
+from lib.snapshot import SnapshotLog
+from lib.writer import OutputWriter
 
-if __name__ == "__main__":
+CUR_DIR = os.path.dirname(os.path.realpath(__file__))
 
-    CUR_DIR = os.path.dirname(os.path.realpath(__file__))
+# Namespaces for XML
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+CAP_NS = "{urn:oasis:names:tc:emergency:cap:1.1}"
 
-    # Namespaces for XML
-    ATOM_NS = "{http://www.w3.org/2005/Atom}"
-    CAP_NS = "{urn:oasis:names:tc:emergency:cap:1.1}"
-
-    # Instantiate the parser
-    parser = Parser(CUR_DIR)
+def parse_alerts(parser):
+    """
+    Requests the alerts feed and parses every entry in it. Returns the list
+    of alerts and an index of them by county and zone.
+    """
 
     # Try to load the previous alerts
     previous_alerts_filepath = os.path.join(parser.output_dir, 'alerts.json')
@@ -41,181 +49,273 @@ if __name__ == "__main__":
     except Parser.XMLError:
         parser.log_error("Bad XML Received. Aborting.")
         parser.save_bad_xml(request_data)
+        record_failed_cycle(parser)
         sys.exit("Bad XML")
+    except (IOError, httplib.HTTPException) as e:
+        # httplib errors like BadStatusLine and IncompleteRead aren't IOErrors on Python 2
+        parser.log_error("Could not request the alerts feed (%s). Aborting." % e)
+        record_failed_cycle(parser)
+        sys.exit("Feed request failed")
 
     # We will keep all the alerts we parse in a list
     alerts_list = []
 
-    # Loop through all the 'entry' nodes we found
-    for entry_el in entries_list:
+    # Index the alerts by county and zone as we go
+    alert_index = AlertIndex()
 
-        # Alert is just a lightweight object wrapper to keep the code clean (cleaner syntax
-        # than using a dictionary)
-        alert = Parser.Alert()
+    # All the CAP requests for this run go through one fetcher, so its circuit
+    # breaker sees every failure
+    fetcher = CAPFetcher()
 
-        # Find the unique ID and create a unique identifier
-        alert.id = parser.get_element_text(entry_el, ATOM_NS + 'id')
-        alert.uuid = parser.create_unique_identifier(alert.id)
+    # Loop through all the 'entry' nodes we found
+    for entry_el in entries_list:
 
-        # Find the updated time (we need this to look for a previous alert)
+        # Find the unique identifier and the updated time, which is all we need to
+        # look for a previous alert
+        alert_id = parser.get_element_text(entry_el, ATOM_NS + 'id')
+        uuid = parser.create_unique_identifier(alert_id)
         updated_dtstr = parser.get_element_text(entry_el, ATOM_NS + 'updated')
-        alert.updated = dateutil.parser.parse(updated_dtstr).astimezone(pytz.utc).isoformat()
+        updated = dateutil.parser.parse(updated_dtstr).astimezone(pytz.utc).isoformat()
         
         # Before we call out to NOAA for additional info, see if we already have this information
         # from the last time we saved the file. This can save us lots of URL requests and time.
-        previous_alert_dict = parser.find_previous_alert_by_uuid(alert.uuid, alert.updated)
+        previous_alert_dict = parser.find_previous_alert_by_uuid(uuid, updated)
 
         # If it was found, just use the last one
         if previous_alert_dict:
+            alert = Parser.Alert()
+            alert.id = alert_id
+            alert.partial = False
             parser.set_properties_from_dict(alert, previous_alert_dict)
             alerts_list.append(alert)
+            alert_index.add(alert)
             continue
 
         # If this alert was not found in the output of our earlier runs, then we need to parse it
-        if not previous_alert_dict:
-
-            alert.updated_datestr = parser.get_element_text(entry_el, ATOM_NS + 'updated')
-            alert.published_datestr = parser.get_element_text(entry_el, ATOM_NS + 'published')
-            alert.effective_datestr = parser.get_element_text(entry_el, CAP_NS + 'effective')
-            alert.expires_datestr = parser.get_element_text(entry_el, CAP_NS + 'expires')
-            alert.author = parser.get_element_text(entry_el, ATOM_NS + 'author/' + ATOM_NS + 'name')
-            alert.title = parser.get_element_text(entry_el, ATOM_NS + 'title')
-            alert.link = parser.get_element_attr(entry_el, ATOM_NS + 'link', 'href')
-            alert.summary = parser.get_element_text(entry_el, ATOM_NS + 'summary')
-            alert.status = parser.get_element_text(entry_el, CAP_NS + 'status')
-            alert.message_type = parser.get_element_text(entry_el, CAP_NS + 'msgType')
-            alert.event = parser.get_element_text(entry_el, CAP_NS + 'event')
-            alert.category = parser.get_element_text(entry_el, CAP_NS + 'category')
-            alert.urgency = parser.get_element_text(entry_el, CAP_NS + 'urgency')
-            alert.severity = parser.get_element_text(entry_el, CAP_NS + 'severity')
-            alert.certainty = parser.get_element_text(entry_el, CAP_NS + 'certainty')
-            alert.area_description = parser.get_element_text(entry_el, CAP_NS + 'areaDesc')
-            alert.polygon_string = parser.get_element_text(entry_el, CAP_NS + 'polygon')
-
-            # See if the event is something we want to skip
-            if alert.event.lower() in parser.skippable_events_list:
-                parser.log("Skipping event: %s" % alert.event)
-                continue
-
-            # If the alert severity is missing, apply a default value
-            if len(alert.severity) == 0 or alert.severity == "":
-                alert.severity = "Unspecified"
-
-            # Try to find the timezone title
-            alert.timezone = parser.get_timezone_from_title(alert.title)
-
-            # Convert the date strings to dates
-            alert.published_local = dateutil.parser.parse(alert.published_datestr)
-            alert.expires_local = dateutil.parser.parse(alert.expires_datestr)
-            alert.updated_local = dateutil.parser.parse(alert.updated_datestr)
-            alert.effective_local = dateutil.parser.parse(alert.effective_datestr)
-
-            # Convert the dates to UTC strings in ISO format
-            alert.published = alert.published_local.astimezone(pytz.utc).isoformat()
-            alert.expires = alert.expires_local.astimezone(pytz.utc).isoformat()
-            alert.updated = alert.updated_local.astimezone(pytz.utc).isoformat()
-            alert.effective = alert.effective_local.astimezone(pytz.utc).isoformat()
-
-            # Load and parse the CAP XML
-            try:
-                parser.log("Requesting CAP URL for UUID: %s" % alert.uuid)
-                parser.log("URL: %s" % alert.link)
-                f = urllib2.urlopen(alert.link, timeout=10)
-                request_data = f.read()
-                cap_tree = parser.load_xml_from_url_contents(request_data)
-                # Pause for a half second to keep from overwhelming NOAA's servers
-                time.sleep(0.5)
-            except Parser.XMLError:
-                parser.log_error("Bad CAP XML Received. Skipping.")
-                parser.save_bad_xml(request_data)
-                cap_tree = ET.Element('')
-
-            # Get the extended elements we need
-            alert.sender = parser.get_element_text(cap_tree, CAP_NS + 'info/' + CAP_NS + 'senderName')
-            alert.instruction = parser.get_element_text(cap_tree, CAP_NS + 'info/' + CAP_NS + 'instruction')
-            alert.description = parser.get_element_text(cap_tree, CAP_NS + 'info/' + CAP_NS + 'description')
-            alert.note = parser.get_element_text(cap_tree, CAP_NS + 'note')
-
-            # If the sender is blank, label it "Unknown"
-            if len(alert.sender) == 0 or alert.sender == "":
-                parser.log("Missing Sender for Alert %s" % alert.uuid)
-                alert.sender = "Unknown"
-
-            # We try to get the region name from the sender value
-            alert.region = parser.get_region_from_sender(alert.sender)
-
-            # If the alert contains a polygon string, we need to turn it into a valid
-            # cooridnate array by flipping the verticies from lat/long to long/lat
-            if alert.polygon_string:
-                try:
-                    alert.polygon = parser.create_polygon_coords(alert.polygon_string)
-                except Parser.GeometryError:
-                    alert.polygon = []
-            else:
-                alert.polygon = []
-
-            # Find all the counties for this alert
-            alert.county_fips_list = []
-            for item in entry_el.findall(CAP_NS + 'geocode'):
-                for value_name_el in item.findall(ATOM_NS + 'valueName'):
-                    if value_name_el.text == "FIPS6":
-                        value_el = value_name_el.getnext()
-                        if value_el is not None and value_el.text:
-                            codes = value_el.text.split(" ")
-                            alert.county_fips_list.extend(codes)
-
-            # Find all the UGC zones and counties for this alert
-            alert.ugc_codes_list = []
-            for item in entry_el.findall(CAP_NS + 'geocode'):
-                for value_name_el in item.findall(ATOM_NS + 'valueName'):
-                    if value_name_el.text == "UGC":
-                        value_el = value_name_el.getnext()
-                        if value_el is not None and value_el.text:
-                            codes = value_el.text.split(" ")
-                            alert.ugc_codes_list.extend(codes)
-
-            # The ugc_codes_list will contain both zone and county codes
-            additional_counties = parser.get_county_fips_for_ugc_codes(alert.ugc_codes_list)
-            alert.county_fips_list.extend(additional_counties)
-
-            # Make sure the lists are unique
-            alert.county_fips_list = list(set(alert.county_fips_list))
-            alert.ugc_codes_list = list(set(alert.ugc_codes_list))
-
-            # Find the counties and states associated with the fips code list
-            alert.counties = parser.get_counties_by_fips(alert.county_fips_list)
-            alert.states = parser.get_states_by_county_fips(alert.county_fips_list)
-            alert.ugc_zones = parser.get_zones_by_code(alert.ugc_codes_list)
-
-            # Find the states associated with the UGC Zones and append them
-            extra_states = parser.get_states_by_ugc_codes(alert.ugc_codes_list)
-            alert.states.extend(extra_states)
-
-            # Make the lists of counties, states, and zones unique
-            alert.counties = {c['fips']:c for c in alert.counties}.values()
-            alert.ugc_zones = {z['code']:z for z in alert.ugc_zones}.values()
-            alert.states = list(set([s['name'] for s in alert.states]))
-
-            # If we cannot find a region, use the list of states
-            if alert.region == None:
-                if len(alert.states) > 0:
-                    alert.region = ", ".join(alert.states)
-                else:
-                    alert.region = "Unknown"
-
-            # If the alert event is "Special Weather Statement" or "Severe Weather Statement", 
-            # see if we can identify elements in the description to make it more clear. This will
-            # become a new element we call "event_title"
-            if alert.event == "Special Weather Statement" or alert.event == "Severe Weather Statement":
-                alert.event_title = parser.refine_weather_statement(alert.description)
-            else:
-                # If it's not "Special Weather Statement", just use the event type as the event title
-                alert.event_title = alert.event
-
-            # We are done with this alert, so append it to the list
-            alerts_list.append(alert)
+        alert = parse_entry(parser, entry_el, lambda a: fetch_cap_tree(parser, fetcher, a), uuid)
 
-    ### File Writing ###
+        # Events we skip don't make it into the output
+        if alert is None:
+            continue
+
+        # We are done with this alert, so append it to the list
+        alerts_list.append(alert)
+        alert_index.add(alert)
+
+    parser.log(fetcher.get_summary())
+
+    return alerts_list, alert_index
+
+def parse_entry(parser, entry_el, get_cap_tree=None, uuid=None):
+    """
+    Parses an entry from the alerts feed into an alert. get_cap_tree is called
+    with the alert once the feed fields are filled in, and returns its parsed
+    CAP document (or None if it couldn't be loaded). The uuid can be passed in
+    if the caller has already worked it out. Returns None for events we skip.
+    """
+
+    # Alert is just a lightweight object wrapper to keep the code clean (cleaner syntax
+    # than using a dictionary)
+    alert = Parser.Alert()
+    alert.partial = False
+
+    # Find the unique ID and create a unique identifier
+    alert.id = parser.get_element_text(entry_el, ATOM_NS + 'id')
+    alert.uuid = uuid if uuid is not None else parser.create_unique_identifier(alert.id)
+
+    alert.updated_datestr = parser.get_element_text(entry_el, ATOM_NS + 'updated')
+    alert.published_datestr = parser.get_element_text(entry_el, ATOM_NS + 'published')
+    alert.effective_datestr = parser.get_element_text(entry_el, CAP_NS + 'effective')
+    alert.expires_datestr = parser.get_element_text(entry_el, CAP_NS + 'expires')
+    alert.author = parser.get_element_text(entry_el, ATOM_NS + 'author/' + ATOM_NS + 'name')
+    alert.title = parser.get_element_text(entry_el, ATOM_NS + 'title')
+    alert.link = parser.get_element_attr(entry_el, ATOM_NS + 'link', 'href')
+    alert.summary = parser.get_element_text(entry_el, ATOM_NS + 'summary')
+    alert.status = parser.get_element_text(entry_el, CAP_NS + 'status')
+    alert.message_type = parser.get_element_text(entry_el, CAP_NS + 'msgType')
+    alert.event = parser.get_element_text(entry_el, CAP_NS + 'event')
+    alert.category = parser.get_element_text(entry_el, CAP_NS + 'category')
+    alert.urgency = parser.get_element_text(entry_el, CAP_NS + 'urgency')
+    alert.severity = parser.get_element_text(entry_el, CAP_NS + 'severity')
+    alert.certainty = parser.get_element_text(entry_el, CAP_NS + 'certainty')
+    alert.area_description = parser.get_element_text(entry_el, CAP_NS + 'areaDesc')
+    alert.polygon_string = parser.get_element_text(entry_el, CAP_NS + 'polygon')
+
+    # See if the event is something we want to skip
+    if alert.event.lower() in parser.skippable_events_list:
+        parser.log("Skipping event: %s" % alert.event)
+        return None
+
+    # If the alert severity is missing, apply a default value
+    if len(alert.severity) == 0 or alert.severity == "":
+        alert.severity = "Unspecified"
+
+    # Try to find the timezone title
+    alert.timezone = parser.get_timezone_from_title(alert.title)
+
+    # Convert the date strings to dates
+    alert.published_local = dateutil.parser.parse(alert.published_datestr)
+    alert.expires_local = dateutil.parser.parse(alert.expires_datestr)
+    alert.updated_local = dateutil.parser.parse(alert.updated_datestr)
+    alert.effective_local = dateutil.parser.parse(alert.effective_datestr)
+
+    # Convert the dates to UTC strings in ISO format
+    alert.published = alert.published_local.astimezone(pytz.utc).isoformat()
+    alert.expires = alert.expires_local.astimezone(pytz.utc).isoformat()
+    alert.updated = alert.updated_local.astimezone(pytz.utc).isoformat()
+    alert.effective = alert.effective_local.astimezone(pytz.utc).isoformat()
+
+    # Load and parse the CAP XML. If we can't get it, the alert is still
+    # written out from what the feed gave us and is requested again next run.
+    cap_tree = get_cap_tree(alert) if get_cap_tree else None
+    if cap_tree is None:
+        alert.partial = True
+        cap_tree = ET.Element(CAP_NS + 'alert')
+
+    # Get the extended elements we need
+    alert.sender = parser.get_element_text(cap_tree, CAP_NS + 'info/' + CAP_NS + 'senderName')
+    alert.instruction = parser.get_element_text(cap_tree, CAP_NS + 'info/' + CAP_NS + 'instruction')
+    alert.description = parser.get_element_text(cap_tree, CAP_NS + 'info/' + CAP_NS + 'description')
+    alert.note = parser.get_element_text(cap_tree, CAP_NS + 'note')
+
+    # If the sender is blank, label it "Unknown"
+    if len(alert.sender) == 0 or alert.sender == "":
+        parser.log("Missing Sender for Alert %s" % alert.uuid)
+        alert.sender = "Unknown"
+
+    # We try to get the region name from the sender value
+    alert.region = parser.get_region_from_sender(alert.sender)
+
+    # If the alert contains a polygon string, we need to turn it into a valid
+    # cooridnate array by flipping the verticies from lat/long to long/lat
+    if alert.polygon_string:
+        try:
+            alert.polygon = parser.create_polygon_coords(alert.polygon_string)
+        except Parser.GeometryError:
+            alert.polygon = []
+    else:
+        alert.polygon = []
+
+    # Find all the counties for this alert
+    alert.county_fips_list = []
+    for item in entry_el.findall(CAP_NS + 'geocode'):
+        for value_name_el in item.findall(ATOM_NS + 'valueName'):
+            if value_name_el.text == "FIPS6":
+                value_el = value_name_el.getnext()
+                if value_el is not None and value_el.text:
+                    codes = value_el.text.split(" ")
+                    alert.county_fips_list.extend(codes)
+
+    # Find all the UGC zones and counties for this alert
+    alert.ugc_codes_list = []
+    for item in entry_el.findall(CAP_NS + 'geocode'):
+        for value_name_el in item.findall(ATOM_NS + 'valueName'):
+            if value_name_el.text == "UGC":
+                value_el = value_name_el.getnext()
+                if value_el is not None and value_el.text:
+                    codes = value_el.text.split(" ")
+                    alert.ugc_codes_list.extend(codes)
+
+    # The ugc_codes_list will contain both zone and county codes
+    additional_counties = parser.get_county_fips_for_ugc_codes(alert.ugc_codes_list)
+    alert.county_fips_list.extend(additional_counties)
+
+    # Make sure the lists are unique
+    alert.county_fips_list = list(set(alert.county_fips_list))
+    alert.ugc_codes_list = list(set(alert.ugc_codes_list))
+
+    # Find the counties and states associated with the fips code list
+    alert.counties = parser.get_counties_by_fips(alert.county_fips_list)
+    alert.states = parser.get_states_by_county_fips(alert.county_fips_list)
+    alert.ugc_zones = parser.get_zones_by_code(alert.ugc_codes_list)
+
+    # Find the states associated with the UGC Zones and append them
+    extra_states = parser.get_states_by_ugc_codes(alert.ugc_codes_list)
+    alert.states.extend(extra_states)
+
+    # Make the lists of counties, states, and zones unique
+    alert.counties = {c['fips']:c for c in alert.counties}.values()
+    alert.ugc_zones = {z['code']:z for z in alert.ugc_zones}.values()
+    alert.states = list(set([s['name'] for s in alert.states]))
+
+    # If we cannot find a region, use the list of states
+    if alert.region == None:
+        if len(alert.states) > 0:
+            alert.region = ", ".join(alert.states)
+        else:
+            alert.region = "Unknown"
+
+    # If the alert event is "Special Weather Statement" or "Severe Weather Statement", 
+    # see if we can identify elements in the description to make it more clear. This will
+    # become a new element we call "event_title"
+    if alert.event == "Special Weather Statement" or alert.event == "Severe Weather Statement":
+        alert.event_title = parser.refine_weather_statement(alert.description)
+    else:
+        # If it's not "Special Weather Statement", just use the event type as the event title
+        alert.event_title = alert.event
+
+    return alert
+
+def fetch_cap_tree(parser, fetcher, alert):
+    """
+    Requests and parses the CAP document for an alert. Returns None if it
+    could not be loaded.
+    """
+
+    circuit_was_open = fetcher.circuit_open
+
+    try:
+        parser.log("Requesting CAP URL for UUID: %s" % alert.uuid)
+        parser.log("URL: %s" % alert.link)
+        request_data = fetcher.fetch(alert.link)
+    except CAPFetcher.CircuitOpenError:
+        parser.log("Skipping CAP request for UUID %s, too many requests have failed." % alert.uuid)
+        return None
+    except CAPFetcher.FetchError as e:
+        parser.log_error("CAP request failed for UUID %s: %s" % (alert.uuid, e.value))
+        if fetcher.circuit_open and not circuit_was_open:
+            parser.log_error("Too many CAP requests failed. Skipping the rest for this run.")
+        return None
+
+    try:
+        return parser.load_xml_from_url_contents(request_data)
+    except Parser.XMLError:
+        parser.log_error("Bad CAP XML Received for UUID %s. Skipping." % alert.uuid)
+        parser.save_bad_xml(request_data)
+        return None
+
+def create_scheduler(parser):
+    state_filepath = os.path.join(parser.output_dir, 'scheduler.json')
+    churn_log_filepath = os.path.join(parser.logs_dir, 'churn.txt')
+    return PollScheduler(state_filepath, churn_log_filepath)
+
+def record_failed_cycle(parser):
+    # Tell the scheduler so it backs off before the next poll
+    scheduler = create_scheduler(parser)
+    scheduler.record_cycle(0, error=True)
+    scheduler.save()
+
+def schedule_next_update(parser, alerts_list):
+    """
+    Tells the scheduler how many alerts changed in this run. Returns the
+    current time along with the created and next update strings we publish
+    in the output files.
+    """
+
+    scheduler = create_scheduler(parser)
+    scheduler.record_cycle(parser.count_changed_alerts(alerts_list))
+    scheduler.save()
+
+    dt_now = datetime.datetime.now(pytz.utc).astimezone(pytz.utc)
+    now = dt_now.isoformat()
+    next_update = scheduler.get_next_update(dt_now).isoformat()
+    return dt_now, now, next_update
+
+def create_template_environment():
+
+    # Jinja is only needed once there is something to render, so we don't pay
+    # for the import until we get here
+    import jinja2
 
     # Prepare the template engine 
     env = jinja2.Environment()
@@ -227,34 +327,91 @@ if __name__ == "__main__":
 
     env.filters['escape_json'] = jinja_escape_js
 
+    return env
+
+def write_alerts(parser, writer, alerts_list, alert_index, now, next_update):
+    """
+    Renders the alerts into the json tree staged by the writer. Returns the
+    rendered full alerts file, which should only be written with write_state
+    once the json tree has been published.
+    """
+
     # Load the template files
+    env = create_template_environment()
     template_full = env.get_template('alerts_full.tpl.json')
     template_lite = env.get_template('alerts.tpl.json')
     template_detail = env.get_template('alert_detail.tpl.json')
     template_count = env.get_template('counts.tpl.json')
 
-    # Prepare the values we will need for the templates
-    dt_now = datetime.datetime.now(pytz.utc).astimezone(pytz.utc)
-    now = dt_now.isoformat()
-    next_update = (dt_now + datetime.timedelta(minutes=5)).isoformat()
-
-    # Write out the full file
-    filepath_full = os.path.join(parser.output_dir, 'alerts.json')
-    output_full = template_full.render(alerts=alerts_list, created=now, next_update=next_update)
-    parser.write_contents_to_filepath(output_full, filepath_full)
-
     # Write out the regular file
-    filepath_lite = os.path.join(parser.json_dir, 'alerts.json')
     output_lite = template_lite.render(alerts=alerts_list, created=now, next_update=next_update)
-    parser.write_contents_to_filepath(output_lite, filepath_lite)
+    writer.write('alerts.json', output_lite)
 
     # Write out the count file
-    filepath_count = os.path.join(parser.json_dir, 'counts.json')
     output_count = template_count.render(alerts=alerts_list, created=now, next_update=next_update)
-    parser.write_contents_to_filepath(output_count, filepath_count)
+    writer.write('counts.json', output_count)
 
     # Loop through all the alerts and write out individual detail pages
     for alert in alerts_list:
         output_detail = template_detail.render(alert=alert, created=now)
-        filepath_detail = os.path.join(parser.detail_dir, '%s.json' % alert.uuid)
-        parser.write_contents_to_filepath(output_detail, filepath_detail)
+        writer.write('detail/%s.json' % alert.uuid, output_detail)
+
+    # The generation was seeded with the previous one, so remove the detail files of
+    # alerts that are gone. Otherwise the directory, and the cost of seeding it, keeps growing.
+    current_filenames = set(['%s.json' % alert.uuid for alert in alerts_list])
+    removed_count = 0
+    for filename in writer.list_files('detail'):
+        if filename not in current_filenames:
+            writer.remove('detail/%s' % filename)
+            removed_count += 1
+    if removed_count:
+        parser.log("Removed %d detail files for expired alerts." % removed_count)
+
+    # Write out the county and zone index shards that changed
+    written_count, total_count = alert_index.write_shards(writer)
+    parser.log("Wrote %d of %d county and zone index shards." % (written_count, total_count))
+
+    # Write out the GeoJSON for map clients, only building the features that changed
+    start_time = time.time()
+    exporter = GeometryExporter(os.path.join(parser.output_dir, 'geometry_cache.json'), parser.ugc_zones_dict)
+    output_geojson, built_count = exporter.export(alerts_list)
+    writer.write('alerts.geojson', output_geojson)
+    parser.log("Wrote GeoJSON for %d alerts (%d built, %d bytes) in %.1f ms." % (len(alerts_list), built_count,
+        len(output_geojson), (time.time() - start_time) * 1000))
+
+    return template_full.render(alerts=alerts_list, created=now, next_update=next_update)
+
+def write_state(parser, output_full, alerts_list, dt_now):
+    """
+    Writes the files the next run starts from.
+    """
+
+    # Write out the full file
+    filepath_full = os.path.join(parser.output_dir, 'alerts.json')
+    parser.write_contents_to_filepath(output_full, filepath_full)
+
+    # Append a columnar snapshot of this run for analytics and history queries
+    snapshot_log = SnapshotLog(os.path.join(parser.output_dir, 'snapshots'))
+    snapshot_log.append(dt_now, alerts_list)
+
+if __name__ == "__main__":
+
+    # Instantiate the parser
+    parser = Parser(CUR_DIR)
+
+    alerts_list, alert_index = parse_alerts(parser)
+
+    ### File Writing ###
+
+    # Prepare the values we will need for the templates
+    dt_now, now, next_update = schedule_next_update(parser, alerts_list)
+
+    # Everything under output/json is staged and published in one step
+    writer = OutputWriter(parser.output_dir, 'json')
+    writer.begin()
+    output_full = write_alerts(parser, writer, alerts_list, alert_index, now, next_update)
+    writer.publish()
+
+    # The full file is what the next run reads, so it goes out last, once
+    # everything else has been published
+    write_state(parser, output_full, alerts_list, dt_now)
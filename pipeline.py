@@ -0,0 +1,41 @@
+"""
+Runs parse.py and create_pages.py as a single pipeline. The parsed alerts are
+handed to the page generation stage in memory instead of being written out
+as JSON and read back, and each output tree is published once.
+
+    $ python pipeline.py
+"""
+
+import create_pages
+import parse
+
+from lib.parser import Parser
+from lib.writer import OutputWriter
+
+def run_pipeline(parser, alerts_list, alert_index):
+    """
+    Writes every output file for the parsed alerts.
+    """
+
+    dt_now, now, next_update = parse.schedule_next_update(parser, alerts_list)
+
+    # Both stages write into the same staged json tree
+    json_writer = OutputWriter(parser.output_dir, 'json')
+    json_writer.begin()
+    output_full = parse.write_alerts(parser, json_writer, alerts_list, alert_index, now, next_update)
+    alerts, full_alerts = create_pages.create_alert_dicts(alerts_list)
+    create_pages.write_json_pages(json_writer, now, next_update, alerts, full_alerts)
+    json_writer.publish()
+
+    html_writer = OutputWriter(parser.output_dir, 'html')
+    html_writer.begin()
+    create_pages.write_html_pages(html_writer, now, full_alerts)
+    html_writer.publish()
+
+    parse.write_state(parser, output_full, alerts_list, dt_now)
+
+if __name__ == "__main__":
+
+    parser = Parser(parse.CUR_DIR)
+    alerts_list, alert_index = parse.parse_alerts(parser)
+    run_pipeline(parser, alerts_list, alert_index)
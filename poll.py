@@ -0,0 +1,73 @@
+"""
+Polls the alerts feed on the schedule worked out by the PollScheduler instead
+of a fixed cron interval, running the whole pipeline every cycle.
+
+    $ python poll.py
+
+With --simulate, replays a churn log recorded by earlier runs (by default
+output/logs/churn.txt) and compares the adaptive schedule with polling every
+five minutes:
+
+    $ python poll.py --simulate [churn log]
+"""
+
+import argparse
+import os
+import time
+
+import parse
+import pipeline
+
+from lib.parser import Parser
+from lib.scheduler import PollScheduler, load_churn_log, simulate
+
+def poll_forever():
+
+    while True:
+
+        parser = Parser(parse.CUR_DIR)
+
+        try:
+            alerts_list, alert_index = parse.parse_alerts(parser)
+            pipeline.run_pipeline(parser, alerts_list, alert_index)
+        except SystemExit:
+            # parse_alerts has already logged the problem and told the scheduler
+            pass
+        except Exception as e:
+            parser.log_error("Run failed: %s" % e)
+            parse.record_failed_cycle(parser)
+
+        interval = parse.create_scheduler(parser).interval
+        parser.log("Next poll in %d seconds." % interval)
+        time.sleep(interval)
+
+def print_simulation(churn_log_filepath):
+
+    timeline = load_churn_log(churn_log_filepath)
+
+    schedulers = [
+        ("fixed (300s)", PollScheduler(min_interval=300, max_interval=300)),
+        ("adaptive", PollScheduler()),
+    ]
+
+    print "Replaying %d cycles from %s" % (len(timeline), churn_log_filepath)
+    print "%-14s %8s %10s %12s %12s %12s" % ("schedule", "polls", "requests", "mean delay", "p95 delay",
+        "max delay")
+
+    for name, scheduler in schedulers:
+        result = simulate(timeline, scheduler)
+        print "%-14s %8d %10d %11.0fs %11.0fs %11.0fs" % (name, result['polls'], result['requests'],
+            result['mean_delay'], result['p95_delay'], result['max_delay'])
+
+if __name__ == "__main__":
+
+    arg_parser = argparse.ArgumentParser(description="Poll the NOAA alerts feed on an adaptive schedule.")
+    arg_parser.add_argument('--simulate', nargs='?', metavar='CHURN_LOG', default=None,
+        const=os.path.join(parse.CUR_DIR, 'output/logs/churn.txt'),
+        help="replay a recorded churn log instead of polling")
+    args = arg_parser.parse_args()
+
+    if args.simulate:
+        print_simulation(args.simulate)
+    else:
+        poll_forever()